@@ -3,29 +3,55 @@ Main Flask application for the Music Practice Feedback System
 Real implementations: Audiveris OMR + Spotify basic-pitch
 """
 import os
-from flask import Flask, request, jsonify, render_template, send_from_directory
+import uuid
+import functools
+from dataclasses import dataclass
+import hashlib
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from flask import Flask, Request, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+try:
+    from flask_compress import Compress
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import logging
+import orjson
 
-# Real implementations
-from src.audiveris_omr import AudiverisOMR
-from src.oemer_omr import OemerOMR
-from src.real_audio_analyzer import RealAudioAnalyzer
-from src.real_omr_system import RealOMRSystem  # Final fallback if others not available
-from src.real_feedback_generator import RealFeedbackGenerator
 from src.session_manager import SessionManager
-from src.database import init_db
+from src.job_queue import JobQueue
+from src.omr_cache import OMRCache, save_and_hash, validate_pdf
+from src.database import init_db, db_session
+from src.json_provider import OrjsonProvider
 from src.auth import init_auth, AuthManager
+from src.components import MUGIC_BACKEND
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class UploadRequest(Request):
+    """Request that keeps small uploads in memory and spills large ones to disk"""
+    
+    # Uploads up to 1MB stay in RAM; anything larger is streamed to a temp file
+    upload_spool_size = 1024 * 1024
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=self.upload_spool_size, mode='rb+')
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.json = OrjsonProvider(app)
 CORS(app)
+if COMPRESS_AVAILABLE:
+    # gzip/Brotli for the SPA shell, static assets and JSON responses
+    Compress(app)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
@@ -34,89 +60,77 @@ app.config['RECORDINGS_FOLDER'] = 'recordings'
 app.config['ALLOWED_EXTENSIONS'] = {'pdf'}
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-# Ensure directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['RECORDINGS_FOLDER'], exist_ok=True)
+# Resolve storage directories once and ensure they exist
+UPLOAD_DIR = Path(app.config['UPLOAD_FOLDER']).resolve()
+RECORDINGS_DIR = Path(app.config['RECORDINGS_FOLDER']).resolve()
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+RECORDINGS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Initialize database
 init_db()
 
+
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    """Return the request's database connection to the pool"""
+    db_session.remove()
+
 # Initialize authentication
 init_auth(app)
 
-# Initialize REAL components with actual functionality
-# Priority: Audiveris > OEMER > Computer Vision OMR
-omr_system = None
-omr_method = "Unknown"
+# Heavy components (OMR engines, audio models, LLM) are built lazily on first
+# use so importing the app stays cheap on serverless cold starts. Under
+# gunicorn each worker warms them up in the background after forking (see
+# gunicorn.conf.py). OMR, transcription and LLM feedback run in worker
+# processes (see src/analysis_pool.py).
 
-try:
-    # Try Audiveris first (best quality OMR, but requires Java)
-    audiveris_omr = AudiverisOMR()
-    if audiveris_omr.is_available():
-        omr_system = audiveris_omr
-        omr_method = "Audiveris OMR"
-        logger.info("✓ Using Audiveris OMR (GitHub open-source)")
-        logger.info("  Best quality - requires Java runtime")
-except Exception as e:
-    logger.warning(f"Audiveris initialization error: {e}")
-
-# Try OEMER as second choice (great for serverless like Vercel)
-if omr_system is None:
-    try:
-        oemer_omr = OemerOMR()
-        if oemer_omr.is_available():
-            omr_system = oemer_omr
-            omr_method = "OEMER (End-to-end OMR)"
-            logger.info("✓ Using OEMER OMR by BreezeWhite")
-            logger.info("  Excellent quality - serverless-friendly")
-        else:
-            logger.info("⚠ OEMER not found, trying fallback")
-            logger.info("  Install OEMER with: pip install oemer")
-    except Exception as e:
-        logger.warning(f"OEMER initialization error: {e}")
+@functools.cache
+def get_analysis_pool():
+    """Get the process pool that runs OMR, audio transcription and feedback"""
+    from src.analysis_pool import AnalysisPool
+    return AnalysisPool()
+
+
+@functools.cache
+def get_audio_batcher():
+    """Get the micro-batching front end for the audio analyzer"""
+    from src.audio_batcher import AudioBatcher
+    return AudioBatcher(get_analysis_pool())
+
+
+def warm_up_components():
+    """Build all heavy components up front (called once per gunicorn worker)"""
+    get_analysis_pool().warm_up()
+    get_audio_batcher()
 
-# Final fallback to computer vision-based OMR
-if omr_system is None:
-    try:
-        omr_system = RealOMRSystem()
-        omr_method = "Computer Vision OMR"
-        logger.info("⚠ Using computer vision OMR fallback")
-        logger.info("  Good quality - always available")
-    except Exception as e:
-        logger.error(f"All OMR systems failed: {e}")
-        raise RuntimeError("No OMR system available")
 
-# Initialize real audio analyzer with Spotify basic-pitch
-try:
-    audio_analyzer = RealAudioAnalyzer()
-    logger.info("✓ Using Spotify basic-pitch for audio transcription")
-except Exception as e:
-    logger.error(f"Audio analyzer initialization error: {e}")
-    raise RuntimeError("basic-pitch is required. Install with: pip install basic-pitch")
-
-# Real feedback generator with LLM
-feedback_generator = RealFeedbackGenerator()
 session_manager = SessionManager()
+job_queue = JobQueue()
+omr_cache = OMRCache()
 
 logger.info("=" * 60)
-logger.info("Mugic Application Initialized - ALL REAL IMPLEMENTATIONS")
-logger.info(f"OMR: {omr_method}")
+logger.info(f"Mugic Application Initialized - backend: {MUGIC_BACKEND}")
+logger.info("OMR: Audiveris > OEMER > Computer Vision (loaded on first use)")
 logger.info("Audio: Spotify basic-pitch")
 logger.info("Feedback: Open-source LLM (TinyLlama/DistilGPT2)")
 logger.info("Auth: JWT with bcrypt")
 logger.info("=" * 60)
 
 
+# Suffixes accepted for upload, e.g. ('.pdf',)
+ALLOWED_EXT_TUPLE = tuple(f'.{ext}' for ext in app.config['ALLOWED_EXTENSIONS'])
+
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    return filename.lower().endswith(ALLOWED_EXT_TUPLE)
 
 
 @app.route('/')
 def index():
     """Serve the main application page"""
-    return render_template('index.html')
+    # The page is a static SPA shell, so skip Jinja and let conditional GETs return 304
+    return send_from_directory(app.static_folder, 'index.html', max_age=3600, conditional=True)
 
 
 @app.route('/api/upload-sheet-music', methods=['POST'])
@@ -133,14 +147,32 @@ def upload_sheet_music():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Please upload a PDF'}), 400
         
-        # Save the file
+        # Save the file, hashing it on the way to disk
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        partial_path = UPLOAD_DIR / f'.{uuid.uuid4().hex}.part'
+        digest = save_and_hash(file.stream, partial_path)
+        
+        # Reject files that are not PDFs before any OMR backend sees them
+        try:
+            validate_pdf(partial_path)
+        except ValueError as e:
+            partial_path.unlink()
+            return jsonify({'error': str(e)}), 400
+        
+        # Store uploads by content so identical PDFs share one file
+        filepath = UPLOAD_DIR / f'{digest}.pdf'
+        if filepath.exists():
+            partial_path.unlink()
+        else:
+            partial_path.replace(filepath)
         
-        # Analyze the sheet music with REAL OMR (Audiveris or CV-based)
-        logger.info(f"Analyzing sheet music with real OMR: {filename}")
-        analysis = omr_system.analyze_sheet_music(filepath)
+        # Reuse the analysis of an identical upload if we have one
+        analysis = omr_cache.get(digest)
+        if analysis is None:
+            # Analyze the sheet music with REAL OMR (Audiveris or CV-based)
+            logger.info(f"Analyzing sheet music with real OMR: {filename}")
+            analysis = get_analysis_pool().analyze_sheet_music(str(filepath))
+            omr_cache.put(digest, analysis)
         
         # Create a new piece entry
         piece_id = session_manager.create_piece(filename, analysis)
@@ -157,9 +189,45 @@ def upload_sheet_music():
         return jsonify({'error': str(e)}), 500
 
 
+def _run_performance_analysis(piece, audio_path, instrument, disable_dynamics):
+    """Analyze a recorded performance and save the session (runs as a background job)"""
+    piece_id = piece['id']
+    
+    # Analyze the audio performance with REAL Spotify basic-pitch
+    logger.info(f"Analyzing performance with Spotify basic-pitch for piece {piece_id}")
+    # Concurrent jobs are grouped into one batched transcription call
+    audio_analysis = get_audio_batcher().analyze(audio_path, instrument=instrument)
+    logger.info(f"Real audio transcription complete: {audio_analysis.get('total_notes', 0)} notes")
+    
+    # Generate feedback in the analysis pool: the LLM is CPU-bound and would
+    # otherwise stall the gevent worker's only OS thread
+    feedback = get_analysis_pool().generate_feedback(
+        sheet_music_analysis=piece['analysis'],
+        audio_analysis=audio_analysis,
+        disable_dynamics=disable_dynamics
+    )
+    
+    # Save the session
+    session_id = session_manager.save_session(
+        piece_id=piece_id,
+        audio_analysis=audio_analysis,
+        feedback=feedback,
+        instrument=instrument
+    )
+    
+    # Get comparison with previous attempts
+    comparison = session_manager.compare_with_previous(piece_id, session_id)
+    
+    return {
+        'session_id': session_id,
+        'feedback': feedback,
+        'comparison': comparison
+    }
+
+
 @app.route('/api/analyze-performance', methods=['POST'])
 def analyze_performance():
-    """Analyze recorded performance against sheet music with enhanced AI"""
+    """Queue analysis of a recorded performance against sheet music"""
     try:
         data = request.get_json()
         piece_id = data.get('piece_id')
@@ -175,57 +243,71 @@ def analyze_performance():
         if not piece:
             return jsonify({'error': 'Piece not found'}), 404
         
-        # Analyze the audio performance with REAL Spotify basic-pitch
-        logger.info(f"Analyzing performance with Spotify basic-pitch for piece {piece_id}")
-        audio_path = os.path.join(app.config['RECORDINGS_FOLDER'], audio_file)
+        audio_path = str(RECORDINGS_DIR / secure_filename(audio_file))
         
-        # Use real audio analyzer (Spotify basic-pitch)
-        audio_analysis = audio_analyzer.analyze(
+        # Run the heavy analysis off the request path; the client polls /api/job/<id>
+        job_id = job_queue.submit(
+            _run_performance_analysis,
+            piece,
             audio_path,
-            instrument=instrument,
-            apply_noise_reduction=True
-        )
-        logger.info(f"Real audio transcription complete: {audio_analysis.get('total_notes', 0)} notes")
-        
-        # Generate feedback
-        feedback = feedback_generator.generate_feedback(
-            sheet_music_analysis=piece['analysis'],
-            audio_analysis=audio_analysis,
-            disable_dynamics=disable_dynamics
-        )
-        
-        # Save the session
-        session_id = session_manager.save_session(
-            piece_id=piece_id,
-            audio_analysis=audio_analysis,
-            feedback=feedback,
-            instrument=instrument
+            instrument,
+            disable_dynamics
         )
         
-        # Get comparison with previous attempts
-        comparison = session_manager.compare_with_previous(piece_id, session_id)
-        
         return jsonify({
             'success': True,
-            'session_id': session_id,
-            'feedback': feedback,
-            'comparison': comparison
-        })
+            'job_id': job_id,
+            'status': 'queued'
+        }), 202
     
     except Exception as e:
         logger.error(f"Error analyzing performance: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/job/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status and result of a background analysis job"""
+    try:
+        job = job_queue.get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            **job
+        })
+    except Exception as e:
+        logger.error(f"Error fetching job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _with_etag(response, etag):
+    """Tag a listing response so clients can revalidate it cheaply"""
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+
+def _not_modified(etag):
+    """Empty 304 response for a listing the client already has"""
+    return _with_etag(Response(status=304), etag)
+
+
 @app.route('/api/pieces', methods=['GET'])
 def get_pieces():
     """Get all uploaded pieces"""
     try:
+        # Answer polls with 304 until a piece or session is added
+        etag = session_manager.get_pieces_version()
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        
         pieces = session_manager.get_all_pieces()
-        return jsonify({
+        return _with_etag(jsonify({
             'success': True,
             'pieces': pieces
-        })
+        }), etag)
     except Exception as e:
         logger.error(f"Error fetching pieces: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -235,52 +317,73 @@ def get_pieces():
 def get_piece_sessions(piece_id):
     """Get all practice sessions for a piece"""
     try:
+        etag = session_manager.get_sessions_version(piece_id)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        
         sessions = session_manager.get_piece_sessions(piece_id)
-        return jsonify({
+        return _with_etag(jsonify({
             'success': True,
             'sessions': sessions
-        })
+        }), etag)
     except Exception as e:
         logger.error(f"Error fetching sessions: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+# Supported instruments never change at runtime, so the response body and its
+# ETag are computed once at import
+@dataclass(frozen=True, slots=True)
+class Instrument:
+    """A supported instrument (serialized natively by orjson)"""
+    id: str
+    name: str
+    category: str
+
+
+INSTRUMENTS = (
+    # Woodwinds
+    Instrument('flute', 'Flute', 'woodwind'),
+    Instrument('piccolo', 'Piccolo', 'woodwind'),
+    Instrument('clarinet', 'Clarinet', 'woodwind'),
+    Instrument('bass_clarinet', 'Bass Clarinet', 'woodwind'),
+    Instrument('oboe', 'Oboe', 'woodwind'),
+    Instrument('bassoon', 'Bassoon', 'woodwind'),
+    Instrument('saxophone_soprano', 'Soprano Saxophone', 'woodwind'),
+    Instrument('saxophone_alto', 'Alto Saxophone', 'woodwind'),
+    Instrument('saxophone_tenor', 'Tenor Saxophone', 'woodwind'),
+    Instrument('saxophone_baritone', 'Baritone Saxophone', 'woodwind'),
+    
+    # Brass
+    Instrument('trumpet', 'Trumpet', 'brass'),
+    Instrument('cornet', 'Cornet', 'brass'),
+    Instrument('french_horn', 'French Horn', 'brass'),
+    Instrument('trombone', 'Trombone', 'brass'),
+    Instrument('euphonium', 'Euphonium', 'brass'),
+    Instrument('tuba', 'Tuba', 'brass'),
+    
+    # Percussion (pitched)
+    Instrument('xylophone', 'Xylophone', 'percussion'),
+    Instrument('marimba', 'Marimba', 'percussion'),
+    Instrument('vibraphone', 'Vibraphone', 'percussion'),
+    Instrument('glockenspiel', 'Glockenspiel', 'percussion'),
+    Instrument('timpani', 'Timpani', 'percussion'),
+)
+_INSTRUMENTS_JSON = orjson.dumps({'success': True, 'instruments': INSTRUMENTS})
+_INSTRUMENTS_ETAG = hashlib.md5(_INSTRUMENTS_JSON).hexdigest()
+_INSTRUMENTS_HEADERS = {
+    'ETag': f'"{_INSTRUMENTS_ETAG}"',
+    'Cache-Control': 'public, max-age=86400'
+}
+
+
 @app.route('/api/instruments', methods=['GET'])
 def get_instruments():
     """Get list of supported instruments"""
-    instruments = [
-        # Woodwinds
-        {'id': 'flute', 'name': 'Flute', 'category': 'woodwind'},
-        {'id': 'piccolo', 'name': 'Piccolo', 'category': 'woodwind'},
-        {'id': 'clarinet', 'name': 'Clarinet', 'category': 'woodwind'},
-        {'id': 'bass_clarinet', 'name': 'Bass Clarinet', 'category': 'woodwind'},
-        {'id': 'oboe', 'name': 'Oboe', 'category': 'woodwind'},
-        {'id': 'bassoon', 'name': 'Bassoon', 'category': 'woodwind'},
-        {'id': 'saxophone_soprano', 'name': 'Soprano Saxophone', 'category': 'woodwind'},
-        {'id': 'saxophone_alto', 'name': 'Alto Saxophone', 'category': 'woodwind'},
-        {'id': 'saxophone_tenor', 'name': 'Tenor Saxophone', 'category': 'woodwind'},
-        {'id': 'saxophone_baritone', 'name': 'Baritone Saxophone', 'category': 'woodwind'},
-        
-        # Brass
-        {'id': 'trumpet', 'name': 'Trumpet', 'category': 'brass'},
-        {'id': 'cornet', 'name': 'Cornet', 'category': 'brass'},
-        {'id': 'french_horn', 'name': 'French Horn', 'category': 'brass'},
-        {'id': 'trombone', 'name': 'Trombone', 'category': 'brass'},
-        {'id': 'euphonium', 'name': 'Euphonium', 'category': 'brass'},
-        {'id': 'tuba', 'name': 'Tuba', 'category': 'brass'},
-        
-        # Percussion (pitched)
-        {'id': 'xylophone', 'name': 'Xylophone', 'category': 'percussion'},
-        {'id': 'marimba', 'name': 'Marimba', 'category': 'percussion'},
-        {'id': 'vibraphone', 'name': 'Vibraphone', 'category': 'percussion'},
-        {'id': 'glockenspiel', 'name': 'Glockenspiel', 'category': 'percussion'},
-        {'id': 'timpani', 'name': 'Timpani', 'category': 'percussion'},
-    ]
+    if request.if_none_match.contains(_INSTRUMENTS_ETAG):
+        return Response(status=304, headers=_INSTRUMENTS_HEADERS)
     
-    return jsonify({
-        'success': True,
-        'instruments': instruments
-    })
+    return Response(_INSTRUMENTS_JSON, mimetype='application/json', headers=_INSTRUMENTS_HEADERS)
 
 
 @app.route('/health', methods=['GET'])
@@ -453,4 +556,5 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     # Disable debug in production
     debug = os.environ.get('FLASK_ENV', 'development') == 'development'
-    app.run(debug=debug, host='0.0.0.0', port=port)
+    # Development server only - production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=debug, host='0.0.0.0', port=port, threaded=True)
@@ -0,0 +1,36 @@
+"""
+Gunicorn configuration for production deployments
+Loaded automatically by `gunicorn app:app` from the project root
+"""
+import multiprocessing
+import os
+
+# Bind to the platform-provided port
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# One worker process per core so OMR and audio analysis requests run in parallel.
+# Override with WEB_CONCURRENCY on memory-constrained plans.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# gevent workers patch blocking I/O (uploads, Audiveris subprocesses) so a
+# single worker keeps serving other requests while one is waiting
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Long-running OMR analyses need a generous timeout
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Log to stdout/stderr for platform log collectors
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    """Load OMR, audio and LLM models in each worker once it has initialized the app"""
+    import threading
+    from app import warm_up_components
+
+    # Loading the models can outlast the boot timeout, so the worker starts
+    # serving right away (a green thread under gevent) and requests that
+    # arrive first simply load what they need on demand
+    threading.Thread(target=warm_up_components, name='mugic-warm-up', daemon=True).start()
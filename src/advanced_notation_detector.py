@@ -4,15 +4,231 @@ Detects dynamics, crescendos, decrescendos, and alternate endings
 Uses computer vision and pattern recognition for obscure notation elements
 """
 import os
+import functools
 import cv2
 import numpy as np
 import logging
 from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass
 from pathlib import Path
 import tempfile
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Detectors run OCR concurrently; one OpenMP thread per Tesseract instance
+# beats several instances fighting over cores. Set before tesserocr loads.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+try:
+    from tesserocr import PyTessBaseAPI, PSM, RIL
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+from src.numba_compat import njit, prange, NUMBA_AVAILABLE
 
 logger = logging.getLogger(__name__)
 
+# Page-level OCR only needs to find coarse words, so it runs on a half-size
+# copy of the page (1/4 of the pixels); geometry and volta ROIs use full size
+PAGE_OCR_SCALE = 0.5
+
+# Text markers looked for in the page OCR (besides the dynamics markings)
+HAIRPIN_TEXT_MARKERS = ('cresc.', 'decresc.', 'dim.')
+REPEAT_TEXT_MARKERS = ('d.c.', 'd.s.', 'fine', 'coda', 'segno', 'to coda')
+
+# Scans at least this wide find their lines coarse-to-fine: Hough on a half-size
+# pyramid level first, then full-resolution Canny only around the lines found.
+LINE_PYRAMID_MIN_WIDTH = 2000
+
+# Resolution the detectors' pixel limits were tuned at
+REFERENCE_DPI = 300
+
+
+@dataclass(frozen=True, slots=True)
+class DetectionThresholds:
+    """Pixel limits used by the detectors at one scan resolution"""
+    line_votes: int
+    line_min_length: int
+    line_max_gap: int
+    volta_min_length: int
+    barline_min_length: int
+    roi_grow: int           # Half-scale growth merging coarse lines (~20px at full size)
+    hairpin_near: int       # Hairpin closed ends lie within this distance...
+    hairpin_far: int        # ...and the open ends further apart than this
+    volta_text_above: int
+    volta_text_below: int
+    mark_min_area: int
+    mark_max_area: int
+    staccato_max_area: int
+    accent_max_area: int
+    tenuto_max_height: int
+    letter_min_area: int
+    letter_max_area: int
+
+
+@functools.lru_cache(maxsize=None)
+def thresholds_for_dpi(dpi: int) -> DetectionThresholds:
+    """
+    Scale the 300 DPI pixel limits to a scan resolution
+    
+    Args:
+        dpi: Scan resolution
+        
+    Returns:
+        Thresholds with lengths scaled by dpi/300 and areas by its square
+    """
+    scale = dpi / REFERENCE_DPI
+    
+    def length(px: int) -> int:
+        return max(1, int(round(px * scale)))
+    
+    def area(px: int) -> int:
+        return max(1, int(round(px * scale * scale)))
+    
+    return DetectionThresholds(
+        line_votes=length(50),
+        line_min_length=length(30),
+        line_max_gap=length(10),
+        volta_min_length=length(100),
+        barline_min_length=length(50),
+        roi_grow=length(10),
+        hairpin_near=length(20),
+        hairpin_far=length(50),
+        volta_text_above=length(30),
+        volta_text_below=length(10),
+        mark_min_area=area(20),
+        mark_max_area=area(200),
+        staccato_max_area=area(50),
+        accent_max_area=area(100),
+        tenuto_max_height=length(10),
+        letter_min_area=area(50),
+        letter_max_area=area(2000)
+    )
+
+# Box-shaped detections (dynamics, articulations, barlines) are kept as one
+# record per mark in a structured array and only turned into dicts for the API
+DET_DTYPE = np.dtype([
+    ('x', 'i4'), ('y', 'i4'), ('width', 'i4'), ('height', 'i4'),
+    ('confidence', 'f8'), ('subtype', 'U16'), ('method', 'U20')
+])
+
+
+def make_detections(xs, ys, ws, hs, confidence, subtype, method: str) -> np.ndarray:
+    """
+    Build a detection array from column values
+    
+    Args:
+        xs, ys, ws, hs: Bounding boxes, one entry per detection
+        confidence: Confidence per detection (or one value for all)
+        subtype: Subtype per detection (or one value for all)
+        method: Detection method recorded on every detection
+        
+    Returns:
+        Structured array with DET_DTYPE
+    """
+    detections = np.empty(len(xs), dtype=DET_DTYPE)
+    detections['x'] = xs
+    detections['y'] = ys
+    detections['width'] = ws
+    detections['height'] = hs
+    detections['confidence'] = confidence
+    detections['subtype'] = subtype
+    detections['method'] = method
+    return detections
+
+
+def as_dicts(detections: np.ndarray, det_type: str, subtype_key: str = 'subtype',
+             extras: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Convert a detection array to the list-of-dicts form used in analyses
+    
+    Args:
+        detections: Structured array with DET_DTYPE
+        det_type: Value of each record's 'type' field
+        subtype_key: Name the subtype is reported under (e.g. 'marking')
+        extras: Additional fields to merge in, keyed by subtype
+        
+    Returns:
+        One dictionary per detection
+    """
+    extras = extras or {}
+    return [{
+        'type': det_type,
+        subtype_key: subtype,
+        **extras.get(subtype, {}),
+        'x': x,
+        'y': y,
+        'width': width,
+        'height': height,
+        'confidence': confidence,
+        'detection_method': method
+    } for x, y, width, height, confidence, subtype, method in detections.tolist()]
+
+
+@njit(fastmath=True, cache=True)
+def _is_hairpin_pair(lines, i, j, near_d2, far_d2, converging):
+    """Test one line pair for a < (converging) or > shape on squared distances"""
+    dx = lines[i, 0] - lines[j, 0]
+    dy = lines[i, 1] - lines[j, 1]
+    start_d2 = dx * dx + dy * dy
+    dx = lines[i, 2] - lines[j, 2]
+    dy = lines[i, 3] - lines[j, 3]
+    end_d2 = dx * dx + dy * dy
+    
+    if converging:
+        return start_d2 < near_d2 and end_d2 > far_d2
+    return start_d2 > far_d2 and end_d2 < near_d2
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def find_hairpin_pairs(lines, near, far, converging):
+    """
+    Find all (i, j), i < j, line pairs forming a hairpin
+    
+    Args:
+        lines: Line segments as float32[N, 4] (x1, y1, x2, y2)
+        near: Maximum distance between the closed ends
+        far: Minimum distance between the open ends
+        converging: True for crescendos (<), False for decrescendos (>)
+        
+    Returns:
+        int64[M, 2] array of matching index pairs in row-major order
+    """
+    n = lines.shape[0]
+    near_d2 = near * near
+    far_d2 = far * far
+    
+    # First pass counts matches per row so the second can write without locking
+    counts = np.zeros(n, dtype=np.int64)
+    for i in prange(n):
+        count = 0
+        for j in range(i + 1, n):
+            if _is_hairpin_pair(lines, i, j, near_d2, far_d2, converging):
+                count += 1
+        counts[i] = count
+    
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    pairs = np.empty((offsets[n], 2), dtype=np.int64)
+    
+    for i in prange(n):
+        k = offsets[i]
+        for j in range(i + 1, n):
+            if _is_hairpin_pair(lines, i, j, near_d2, far_d2, converging):
+                pairs[k, 0] = i
+                pairs[k, 1] = j
+                k += 1
+    
+    return pairs
+
 
 class AdvancedNotationDetector:
     """
@@ -26,10 +242,30 @@ class AdvancedNotationDetector:
     - Repeat signs and codas
     """
     
-    def __init__(self):
-        """Initialize the advanced notation detector"""
+    def __init__(self, dpi: int = REFERENCE_DPI):
+        """
+        Initialize the advanced notation detector
+        
+        Args:
+            dpi: Resolution of the scans this detector will see; size limits
+                 are computed once for it
+        """
         self.logger = logger
-        self.temp_dir = tempfile.mkdtemp(prefix='mugic_advanced_')
+        self.dpi = dpi
+        self.thresholds = thresholds_for_dpi(dpi)
+        # Only the batched pytesseract fallback writes files; created on first use
+        self._temp_dir = None
+        
+        # In-process Tesseract API, created once and reused for every OCR call.
+        # Falls back to the pytesseract CLI wrapper when tesserocr is missing.
+        self._tess_api = None
+        self._tess_lock = threading.Lock()
+        if TESSEROCR_AVAILABLE:
+            try:
+                self._tess_api = PyTessBaseAPI(psm=PSM.SPARSE_TEXT)
+            except Exception as e:
+                self.logger.warning(f"tesserocr initialization failed, using pytesseract: {e}")
+        self.ocr_available = self._tess_api is not None or PYTESSERACT_AVAILABLE
         
         # Define dynamic markings to detect
         self.dynamics_patterns = {
@@ -45,8 +281,37 @@ class AdvancedNotationDetector:
             'fp': {'intensity': 70, 'name': 'forte-piano'},
         }
         
+        # The page OCR only has to find the tokens above, so restrict Tesseract
+        # to their characters (either case) instead of the full alphabet
+        tokens = ''.join(self.dynamics_patterns) + ''.join(HAIRPIN_TEXT_MARKERS + REPEAT_TEXT_MARKERS)
+        self.page_ocr_whitelist = ''.join(sorted(set(tokens.lower() + tokens.upper()) - {' '}))
+        
+        # Fields attached to each dynamic when it is converted for the analysis;
+        # template matching cannot tell the marking apart
+        self.dynamics_fields = {
+            marking: {'name': info['name'], 'intensity': info['intensity']}
+            for marking, info in self.dynamics_patterns.items()
+        }
+        self.dynamics_fields['detected'] = {'name': 'dynamic_marking', 'intensity': 50}
+        
         self.logger.info("✓ Advanced Notation Detector initialized")
     
+    @property
+    def temp_dir(self) -> str:
+        """Scratch directory for OCR batch files, created on first access"""
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix='mugic_advanced_')
+        return self._temp_dir
+    
+    def __enter__(self):
+        """Use the detector as a context manager that cleans up on exit"""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Release the Tesseract API and temporary files"""
+        self.cleanup()
+        return False
+    
     def enhance_omr_analysis(self, 
                             image_path: str, 
                             base_analysis: Dict[str, Any]) -> Dict[str, Any]:
@@ -64,27 +329,40 @@ class AdvancedNotationDetector:
             self.logger.info("Starting advanced notation detection...")
             
             # Load the image
-            img = cv2.imread(image_path)
-            if img is None:
+            # Every detector works on grayscale, so decode straight to one channel
+            gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
                 raise ValueError(f"Could not load image: {image_path}")
             
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Detect various notation elements
-            dynamics = self._detect_dynamics(gray, img)
-            crescendos = self._detect_crescendos(gray, img)
-            decrescendos = self._detect_decrescendos(gray, img)
-            alternate_endings = self._detect_alternate_endings(gray, img)
-            articulations = self._detect_articulations(gray, img)
-            repeat_signs = self._detect_repeat_signs(gray, img)
+            # The detectors only read the image, and OpenCV/Tesseract release
+            # the GIL, so the expensive passes run side by side on threads
+            with ThreadPoolExecutor(max_workers=4, thread_name_prefix='mugic-notation') as executor:
+                # Run full-page OCR once and share it between the text-based detectors
+                ocr_future = executor.submit(self._run_page_ocr, gray)
+                
+                # Run edge and line detection once; each detector filters the shared lines
+                lines = self._detect_lines(gray)
+                endings_future = executor.submit(self._detect_alternate_endings, gray, lines['horizontal'])
+                
+                ocr_data, ocr_text = ocr_future.result()
+                
+                dynamics_future = executor.submit(self._detect_dynamics, gray, ocr_data)
+                articulations_future = executor.submit(self._detect_articulations, gray, ocr_data)
+                crescendos = self._detect_crescendos(gray, ocr_text, lines['all'])
+                decrescendos = self._detect_decrescendos(gray, ocr_text, lines['all'])
+                repeat_signs = self._detect_repeat_signs(gray, ocr_text, lines['vertical'])
+                
+                dynamics = dynamics_future.result()
+                alternate_endings = endings_future.result()
+                articulations = articulations_future.result()
             
-            # Add to base analysis
+            # Add to base analysis (box detections become dicts only here)
             enhanced_analysis = base_analysis.copy()
-            enhanced_analysis['dynamics'] = dynamics
+            enhanced_analysis['dynamics'] = as_dicts(dynamics, 'dynamic', 'marking', self.dynamics_fields)
             enhanced_analysis['crescendos'] = crescendos
             enhanced_analysis['decrescendos'] = decrescendos
             enhanced_analysis['alternate_endings'] = alternate_endings
-            enhanced_analysis['articulations'] = articulations
+            enhanced_analysis['articulations'] = as_dicts(articulations, 'articulation', 'marking')
             enhanced_analysis['repeat_signs'] = repeat_signs
             enhanced_analysis['has_advanced_detection'] = True
             
@@ -103,60 +381,274 @@ class AdvancedNotationDetector:
             base_analysis['has_advanced_detection'] = False
             return base_analysis
     
-    def _detect_dynamics(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_lines(self, gray: np.ndarray) -> Dict[str, Optional[np.ndarray]]:
+        """
+        Detect line segments once and split them by orientation
+        
+        Hough runs with the loosest parameters any detector needs (hairpins);
+        the stricter length/position limits of the volta and barline detectors
+        are applied here in NumPy.
+        
+        Returns:
+            'all' lines for the hairpin detectors, 'horizontal' volta bracket
+            candidates in the top 60% of the page, and 'vertical' barline candidates
+        """
+        edges = self._detect_edges(gray)
+        t = self.thresholds
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=t.line_votes,
+                                minLineLength=t.line_min_length, maxLineGap=t.line_max_gap)
+        
+        if lines is None:
+            return {'all': None, 'horizontal': None, 'vertical': None}
+        
+        x1, y1, x2, y2 = lines[:, 0, 0], lines[:, 0, 1], lines[:, 0, 2], lines[:, 0, 3]
+        dx = (x2 - x1).astype(np.float32)
+        dy = (y2 - y1).astype(np.float32)
+        angles = np.abs(np.degrees(np.arctan2(dy, dx)))
+        lengths = np.hypot(dx, dy)
+        
+        # Volta brackets: long, nearly horizontal, in the top part of the page
+        top_limit = int(gray.shape[0] * 0.6)
+        horizontal = ((angles < 10) | (angles > 170)) & (lengths >= t.volta_min_length) & \
+                     (np.maximum(y1, y2) < top_limit)
+        
+        # Barlines: nearly vertical
+        vertical = (angles > 80) & (angles < 100) & (lengths >= t.barline_min_length)
+        
+        return {
+            'all': lines,
+            'horizontal': lines[horizontal],
+            'vertical': lines[vertical]
+        }
+    
+    def _detect_edges(self, gray: np.ndarray) -> np.ndarray:
+        """
+        Canny edge map for line detection
+        
+        Large scans are searched coarse-to-fine: lines found on a half-size
+        pyramid level mark the regions where full-resolution Canny runs, and
+        the rest of the edge map stays empty.
+        
+        Returns:
+            Edge map the size of the page
+        """
+        t = self.thresholds
+        h, w = gray.shape
+        if w < LINE_PYRAMID_MIN_WIDTH:
+            return cv2.Canny(gray, 50, 150, apertureSize=3)
+        
+        # Coarse pass: half the resolution, so half the vote and length limits
+        gray_half = cv2.pyrDown(gray)
+        edges_half = cv2.Canny(gray_half, 50, 150, apertureSize=3)
+        lines_half = cv2.HoughLinesP(edges_half, 1, np.pi/180, threshold=max(1, t.line_votes // 2),
+                                     minLineLength=max(1, t.line_min_length // 2),
+                                     maxLineGap=max(1, t.line_max_gap // 2))
+        
+        edges = np.zeros_like(gray)
+        if lines_half is None:
+            return edges
+        
+        # Draw the coarse lines and grow them so close segments share a region
+        mask = np.zeros_like(gray_half)
+        for x1, y1, x2, y2 in lines_half[:, 0]:
+            cv2.line(mask, (int(x1), int(y1)), (int(x2), int(y2)), 255, 1)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (t.roi_grow, t.roi_grow))
+        mask = cv2.dilate(mask, kernel)
+        
+        # Fine pass: full-resolution Canny inside each region's bounding box
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8, ltype=cv2.CV_32S)
+        for x, y, w_box, h_box, _ in stats[1:]:
+            x0, y0 = 2 * x, 2 * y
+            x1, y1 = min(2 * (x + w_box), w), min(2 * (y + h_box), h)
+            edges[y0:y1, x0:x1] = cv2.Canny(gray[y0:y1, x0:x1], 50, 150, apertureSize=3)
+        
+        return edges
+    
+    def _binarize(self, gray: np.ndarray) -> np.ndarray:
+        """Inverted Otsu binarization (ink is white) for the articulation detector"""
+        _, binary_inv = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return binary_inv
+    
+    def _run_page_ocr(self, gray: np.ndarray) -> Tuple[Optional[Dict[str, List]], str]:
+        """
+        OCR the whole page in a single Tesseract pass on a downscaled copy
+        
+        Returns:
+            Word-level data from image_to_data in full-resolution coordinates
+            (None if OCR is unavailable) and the recognized words joined into
+            lowercase text
+        """
+        if not self.ocr_available:
+            return None, ''
+        
+        try:
+            gray_small = cv2.resize(gray, None, fx=PAGE_OCR_SCALE, fy=PAGE_OCR_SCALE,
+                                    interpolation=cv2.INTER_AREA)
+            
+            # Sparse text mode: dynamics and expression text are scattered words
+            data = self._ocr_data(gray_small, psm=11, whitelist=self.page_ocr_whitelist)
+            
+            # Map word boxes back onto the full-resolution page
+            for key in ('left', 'top', 'width', 'height'):
+                data[key] = [int(round(v / PAGE_OCR_SCALE)) for v in data[key]]
+            
+            text = ' '.join(word for word in data['text'] if word.strip()).lower()
+            return data, text
+        except Exception as e:
+            self.logger.warning(f"Page OCR error: {e}")
+            return None, ''
+    
+    def _ocr_data(self, image: np.ndarray, psm: int = 11, whitelist: str = '') -> Dict[str, List]:
+        """
+        Word-level OCR with bounding boxes
+        
+        Args:
+            image: Grayscale image
+            psm: Tesseract page segmentation mode
+            whitelist: Allowed characters (empty for all)
+            
+        Returns:
+            Dictionary shaped like pytesseract's image_to_data output
+            (text, left, top, width, height, conf)
+        """
+        if self._tess_api is None:
+            config = f'--oem 3 --psm {psm}'
+            if whitelist:
+                config += f' -c tessedit_char_whitelist={whitelist}'
+            return pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+        
+        data = {'text': [], 'left': [], 'top': [], 'width': [], 'height': [], 'conf': []}
+        with self._tess_lock:
+            self._set_tess_image(image, psm, whitelist)
+            self._tess_api.Recognize()
+            iterator = self._tess_api.GetIterator()
+            if iterator is None:
+                return data
+            
+            while True:
+                word = iterator.GetUTF8Text(RIL.WORD)
+                if word:
+                    x1, y1, x2, y2 = iterator.BoundingBox(RIL.WORD)
+                    data['text'].append(word)
+                    data['left'].append(x1)
+                    data['top'].append(y1)
+                    data['width'].append(x2 - x1)
+                    data['height'].append(y2 - y1)
+                    data['conf'].append(iterator.Confidence(RIL.WORD))
+                if not iterator.Next(RIL.WORD):
+                    break
+        
+        return data
+    
+    def _ocr_string(self, image: np.ndarray, psm: int = 11, whitelist: str = '') -> str:
+        """Plain-text OCR of an image or region"""
+        if self._tess_api is None:
+            return self._ocr_string_cli(image, psm, whitelist)
+        
+        with self._tess_lock:
+            self._set_tess_image(image, psm, whitelist)
+            return self._tess_api.GetUTF8Text()
+    
+    def _ocr_strings(self, images: List[np.ndarray], psm: int = 11, whitelist: str = '') -> List[str]:
+        """
+        Plain-text OCR of several small regions
+        
+        With the pytesseract fallback, all regions go through a single
+        Tesseract run via a list-of-images file instead of one process each.
+        
+        Returns:
+            Recognized text per image (empty for empty regions)
+        """
+        texts = [''] * len(images)
+        non_empty = [i for i, image in enumerate(images) if image.size]
+        
+        if self._tess_api is not None:
+            for i in non_empty:
+                texts[i] = self._ocr_string(images[i], psm, whitelist)
+            return texts
+        
+        if not non_empty:
+            return texts
+        
+        batch_dir = tempfile.mkdtemp(prefix='ocr_batch_', dir=self.temp_dir)
+        list_path = os.path.join(batch_dir, 'rois.txt')
+        with open(list_path, 'w') as f:
+            for k, i in enumerate(non_empty):
+                roi_path = os.path.join(batch_dir, f'roi_{k}.png')
+                cv2.imwrite(roi_path, images[i])
+                f.write(roi_path + '\n')
+        
+        # Tesseract separates the pages of a multi-image run with form feeds
+        output = self._ocr_string_cli(list_path, psm, whitelist)
+        pages = output.split('\f')
+        for k, i in enumerate(non_empty):
+            texts[i] = pages[k] if k < len(pages) else ''
+        
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        return texts
+    
+    def _ocr_string_cli(self, image, psm: int, whitelist: str) -> str:
+        """Plain-text OCR through the pytesseract CLI wrapper"""
+        config = f'--oem 3 --psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        return pytesseract.image_to_string(image, config=config)
+    
+    def _set_tess_image(self, image: np.ndarray, psm: int, whitelist: str):
+        """Hand a grayscale array to the Tesseract API without encoding it"""
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        self._tess_api.SetPageSegMode(psm)
+        self._tess_api.SetVariable('tessedit_char_whitelist', whitelist)
+        self._tess_api.SetImageBytes(image.tobytes(), width, height, 1, width)
+    
+    def _detect_dynamics(self, gray: np.ndarray,
+                         ocr_data: Optional[Dict[str, List]]) -> np.ndarray:
         """
         Detect dynamic markings (p, pp, f, ff, mf, mp, etc.)
         Uses OCR and pattern matching
+        
+        Args:
+            gray: Grayscale page image
+            ocr_data: Word-level data from the shared page OCR pass
+            
+        Returns:
+            Detection array (DET_DTYPE) with the marking as subtype
         """
-        dynamics = []
+        dynamics = make_detections([], [], [], [], [], [], 'OCR')
         
         try:
-            # Use pytesseract for text detection if available
-            try:
-                import pytesseract
-                
-                # Configure for music notation text
-                custom_config = r'--oem 3 --psm 11 -c tessedit_char_whitelist=pfms'
-                
-                # Get text with bounding boxes
-                data = pytesseract.image_to_data(gray, config=custom_config, output_type=pytesseract.Output.DICT)
+            if ocr_data is not None:
+                words = np.array([text.strip().lower() for text in ocr_data['text']], dtype=object)
                 
-                for i, text in enumerate(data['text']):
-                    text_clean = text.strip().lower()
-                    
-                    # Check if it matches a dynamic marking
-                    if text_clean in self.dynamics_patterns:
-                        dynamics.append({
-                            'type': 'dynamic',
-                            'marking': text_clean,
-                            'name': self.dynamics_patterns[text_clean]['name'],
-                            'intensity': self.dynamics_patterns[text_clean]['intensity'],
-                            'x': data['left'][i],
-                            'y': data['top'][i],
-                            'width': data['width'][i],
-                            'height': data['height'][i],
-                            'confidence': data['conf'][i] / 100.0,
-                            'detection_method': 'OCR'
-                        })
-                
-            except ImportError:
+                # Keep the words that match a dynamic marking
+                hits = np.flatnonzero(np.isin(words, list(self.dynamics_patterns)))
+                dynamics = make_detections(
+                    np.take(ocr_data['left'], hits),
+                    np.take(ocr_data['top'], hits),
+                    np.take(ocr_data['width'], hits),
+                    np.take(ocr_data['height'], hits),
+                    np.take(np.asarray(ocr_data['conf'], dtype=np.float64), hits) / 100.0,
+                    words[hits],
+                    'OCR'
+                )
+            else:
                 # Fallback: Template matching for common dynamics
-                dynamics = self._detect_dynamics_template_matching(gray, img)
+                dynamics = self._detect_dynamics_template_matching(gray)
                 
         except Exception as e:
             self.logger.warning(f"Dynamic detection error: {e}")
         
         return dynamics
     
-    def _detect_dynamics_template_matching(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_dynamics_template_matching(self, gray: np.ndarray) -> np.ndarray:
         """
         Fallback method using template matching for dynamics
         Detects characteristic shapes of p, f, m letters
         """
-        dynamics = []
-        
         # Look for italic lowercase 'f' and 'p' shapes
         # These are typically in the lower third of the image
+        t = self.thresholds
         h, w = gray.shape
         bottom_third = gray[int(h * 0.66):, :]
         
@@ -170,9 +662,10 @@ class AdvancedNotationDetector:
         # Find contours (potential letter shapes)
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
+        boxes = []
         for contour in contours:
             area = cv2.contourArea(contour)
-            if area < 50 or area > 2000:  # Filter by size
+            if area < t.letter_min_area or area > t.letter_max_area:  # Filter by size
                 continue
             
             x, y, w_box, h_box = cv2.boundingRect(contour)
@@ -180,138 +673,146 @@ class AdvancedNotationDetector:
             
             # Dynamics text is typically taller than wide
             if 0.3 < aspect_ratio < 1.5 and h_box > w_box:
-                # Estimate dynamic based on position and characteristics
-                dynamics.append({
-                    'type': 'dynamic',
-                    'marking': 'detected',
-                    'name': 'dynamic_marking',
-                    'intensity': 50,  # Default medium
-                    'x': x,
-                    'y': y + int(h * 0.66),
-                    'width': w_box,
-                    'height': h_box,
-                    'confidence': 0.6,
-                    'detection_method': 'template_matching'
-                })
+                boxes.append((x, y + int(h * 0.66), w_box, h_box))
         
-        return dynamics
+        # The marking itself is unknown; it is reported at medium intensity
+        boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+        return make_detections(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3],
+                               0.6, 'detected', 'template_matching')
     
-    def _detect_crescendos(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _find_hairpins(self, lines: Optional[np.ndarray], converging: bool) -> List[Dict[str, Any]]:
+        """
+        Find line pairs forming hairpins
+        
+        Args:
+            lines: HoughLinesP output (N x 1 x 4), or None
+            converging: True for crescendos (<), False for decrescendos (>)
+            
+        Returns:
+            One entry per matching pair with merged coordinates and its opening length
+        """
+        if lines is None or len(lines) < 2:
+            return []
+        
+        flat = lines.reshape(-1, 4)
+        arr = flat.astype(np.float32)
+        
+        if NUMBA_AVAILABLE:
+            # Compiled pair loop: no N x N distance matrices
+            pairs = find_hairpin_pairs(arr, np.float32(self.thresholds.hairpin_near),
+                                       np.float32(self.thresholds.hairpin_far), converging)
+            i_idx, j_idx = pairs[:, 0], pairs[:, 1]
+        else:
+            i_idx, j_idx = self._find_hairpin_pairs_numpy(arr, converging)
+        
+        first = flat[i_idx]
+        second = flat[j_idx]
+        start_x = np.minimum(first[:, 0], second[:, 0])
+        start_y = (first[:, 1] + second[:, 1]) // 2
+        end_x = np.maximum(first[:, 2], second[:, 2])
+        end_y = (first[:, 3] + second[:, 3]) // 2
+        
+        # Opening of the hairpin: distance between the far ends of the two lines.
+        # Only emitted hairpins pay for a square root.
+        opening = arr[i_idx, 2:] - arr[j_idx, 2:] if converging else arr[i_idx, :2] - arr[j_idx, :2]
+        length = np.sqrt((opening * opening).sum(axis=1))
+        
+        return [{
+            'start_x': int(start_x[k]),
+            'start_y': int(start_y[k]),
+            'end_x': int(end_x[k]),
+            'end_y': int(end_y[k]),
+            'length': float(length[k])
+        } for k in range(len(i_idx))]
+    
+    def _find_hairpin_pairs_numpy(self, arr: np.ndarray, converging: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Hairpin pair search by broadcasting (used when numba is unavailable)"""
+        starts = arr[:, :2]
+        ends = arr[:, 2:]
+        
+        # Pairwise squared distances between all line starts and all line ends
+        start_diff = starts[:, None, :] - starts[None, :, :]
+        end_diff = ends[:, None, :] - ends[None, :, :]
+        start_d2 = (start_diff * start_diff).sum(axis=-1)
+        end_d2 = (end_diff * end_diff).sum(axis=-1)
+        
+        # < shapes start close together and end apart; > shapes the reverse
+        near_d2 = self.thresholds.hairpin_near ** 2
+        far_d2 = self.thresholds.hairpin_far ** 2
+        if converging:
+            mask = (start_d2 < near_d2) & (end_d2 > far_d2)
+        else:
+            mask = (start_d2 > far_d2) & (end_d2 < near_d2)
+        return np.nonzero(np.triu(mask, k=1))
+    
+    def _detect_crescendos(self, gray: np.ndarray, ocr_text: str,
+                           lines: Optional[np.ndarray]) -> List[Dict[str, Any]]:
         """
         Detect crescendo markings (< shapes or "cresc." text)
         """
         crescendos = []
         
         try:
-            # Look for < shaped lines (hairpin crescendo)
-            # Use Hough Line Transform to find diagonal lines
-            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, 
-                                   minLineLength=30, maxLineGap=10)
+            # Look for < shaped line pairs (hairpin crescendo)
+            for hairpin in self._find_hairpins(lines, converging=True):
+                crescendos.append({
+                    'type': 'crescendo',
+                    'shape': 'hairpin',
+                    **hairpin,
+                    'confidence': 0.75,
+                    'detection_method': 'line_detection'
+                })
             
-            if lines is not None:
-                # Group lines that form < shapes
-                for i in range(len(lines)):
-                    for j in range(i + 1, len(lines)):
-                        x1, y1, x2, y2 = lines[i][0]
-                        x3, y3, x4, y4 = lines[j][0]
-                        
-                        # Check if lines form a < shape (converging lines)
-                        # Lines should start close together and end further apart
-                        start_dist = np.sqrt((x1 - x3)**2 + (y1 - y3)**2)
-                        end_dist = np.sqrt((x2 - x4)**2 + (y2 - y4)**2)
-                        
-                        if start_dist < 20 and end_dist > 50:
-                            crescendos.append({
-                                'type': 'crescendo',
-                                'shape': 'hairpin',
-                                'start_x': min(x1, x3),
-                                'start_y': (y1 + y3) // 2,
-                                'end_x': max(x2, x4),
-                                'end_y': (y2 + y4) // 2,
-                                'length': end_dist,
-                                'confidence': 0.75,
-                                'detection_method': 'line_detection'
-                            })
-            
-            # Also look for "cresc." text using OCR if available
-            try:
-                import pytesseract
-                text = pytesseract.image_to_string(gray).lower()
-                if 'cresc' in text:
-                    crescendos.append({
-                        'type': 'crescendo',
-                        'shape': 'text',
-                        'text': 'cresc.',
-                        'confidence': 0.8,
-                        'detection_method': 'OCR'
-                    })
-            except ImportError:
-                pass
+            # Also look for "cresc." text in the page OCR
+            if 'cresc' in ocr_text:
+                crescendos.append({
+                    'type': 'crescendo',
+                    'shape': 'text',
+                    'text': 'cresc.',
+                    'confidence': 0.8,
+                    'detection_method': 'OCR'
+                })
                 
         except Exception as e:
             self.logger.warning(f"Crescendo detection error: {e}")
         
         return crescendos
     
-    def _detect_decrescendos(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_decrescendos(self, gray: np.ndarray, ocr_text: str,
+                             lines: Optional[np.ndarray]) -> List[Dict[str, Any]]:
         """
         Detect decrescendo/diminuendo markings (> shapes or "dim." text)
         """
         decrescendos = []
         
         try:
-            # Look for > shaped lines (hairpin decrescendo)
-            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50,
-                                   minLineLength=30, maxLineGap=10)
+            # Look for > shaped line pairs (hairpin decrescendo)
+            for hairpin in self._find_hairpins(lines, converging=False):
+                decrescendos.append({
+                    'type': 'decrescendo',
+                    'shape': 'hairpin',
+                    **hairpin,
+                    'confidence': 0.75,
+                    'detection_method': 'line_detection'
+                })
             
-            if lines is not None:
-                # Group lines that form > shapes
-                for i in range(len(lines)):
-                    for j in range(i + 1, len(lines)):
-                        x1, y1, x2, y2 = lines[i][0]
-                        x3, y3, x4, y4 = lines[j][0]
-                        
-                        # Check if lines form a > shape (diverging lines)
-                        # Lines should start further apart and end close together
-                        start_dist = np.sqrt((x1 - x3)**2 + (y1 - y3)**2)
-                        end_dist = np.sqrt((x2 - x4)**2 + (y2 - y4)**2)
-                        
-                        if start_dist > 50 and end_dist < 20:
-                            decrescendos.append({
-                                'type': 'decrescendo',
-                                'shape': 'hairpin',
-                                'start_x': min(x1, x3),
-                                'start_y': (y1 + y3) // 2,
-                                'end_x': max(x2, x4),
-                                'end_y': (y2 + y4) // 2,
-                                'length': start_dist,
-                                'confidence': 0.75,
-                                'detection_method': 'line_detection'
-                            })
-            
-            # Look for "dim." or "decresc." text
-            try:
-                import pytesseract
-                text = pytesseract.image_to_string(gray).lower()
-                if 'dim' in text or 'decresc' in text:
-                    decrescendos.append({
-                        'type': 'decrescendo',
-                        'shape': 'text',
-                        'text': 'dim.' if 'dim' in text else 'decresc.',
-                        'confidence': 0.8,
-                        'detection_method': 'OCR'
-                    })
-            except ImportError:
-                pass
+            # Look for "dim." or "decresc." text in the page OCR
+            if 'dim' in ocr_text or 'decresc' in ocr_text:
+                decrescendos.append({
+                    'type': 'decrescendo',
+                    'shape': 'text',
+                    'text': 'dim.' if 'dim' in ocr_text else 'decresc.',
+                    'confidence': 0.8,
+                    'detection_method': 'OCR'
+                })
                 
         except Exception as e:
             self.logger.warning(f"Decrescendo detection error: {e}")
         
         return decrescendos
     
-    def _detect_alternate_endings(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_alternate_endings(self, gray: np.ndarray,
+                                  lines: Optional[np.ndarray]) -> List[Dict[str, Any]]:
         """
         Detect alternate endings (prima volta, seconda volta, etc.)
         These are horizontal brackets with numbers above them that indicate
@@ -326,123 +827,172 @@ class AdvancedNotationDetector:
         endings = []
         
         try:
+            t = self.thresholds
             h, w = gray.shape
             
             # Alternate endings are typically in the top portion of staves
             # They appear as horizontal brackets (voltas) with numbers
             top_section = gray[:int(h * 0.6), :]
             
-            # Look for horizontal lines (the bracket part of volta)
-            edges = cv2.Canny(top_section, 50, 150, apertureSize=3)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=100,
-                                   minLineLength=100, maxLineGap=5)
-            
+            # Horizontal lines in the top section (the bracket part of volta)
+            brackets = []
+            regions = []
             if lines is not None:
                 for line in lines:
-                    x1, y1, x2, y2 = line[0]
+                    x1, y1, x2, y2 = (int(v) for v in line[0])
+                    brackets.append((x1, y1, x2))
                     
-                    # Check if line is mostly horizontal
-                    angle = np.abs(np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi)
-                    if angle < 10 or angle > 170:  # Nearly horizontal
-                        # Look for numbers or text near this line
-                        # Voltas have numbers like "1.", "2.", "1,2", "1-3", etc.
-                        region = top_section[max(0, y1-30):min(top_section.shape[0], y1+10),
-                                        x1:x2]
-                        
-                        # Try to detect numbers and volta notation
-                        try:
-                            import pytesseract
-                            # Allow numbers, periods, commas, dashes for volta notation
-                            config = r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789.,-'
-                            text = pytesseract.image_to_string(region, config=config).strip()
-                            
-                            if text and any(c.isdigit() for c in text):
-                                endings.append({
-                                    'type': 'alternate_ending',
-                                    'volta_text': text,  # e.g., "1.", "2.", "1,2", "1-3"
-                                    'x': x1,
-                                    'y': y1,
-                                    'width': x2 - x1,
-                                    'bracket_type': 'volta',
-                                    'description': f'Take this ending when playing ending {text}',
-                                    'confidence': 0.85,
-                                    'detection_method': 'bracket_and_OCR'
-                                })
-                        except ImportError:
-                            # Fallback: just note that a bracket was found
-                            endings.append({
-                                'type': 'alternate_ending',
-                                'volta_text': 'unknown',
-                                'x': x1,
-                                'y': y1,
-                                'width': x2 - x1,
-                                'bracket_type': 'volta',
-                                'description': 'Alternate ending bracket detected',
-                                'confidence': 0.6,
-                                'detection_method': 'bracket_only'
-                            })
-                            
+                    # Look for numbers or text near this line
+                    # Voltas have numbers like "1.", "2.", "1,2", "1-3", etc.
+                    regions.append(top_section[max(0, y1 - t.volta_text_above):
+                                               min(top_section.shape[0], y1 + t.volta_text_below),
+                                               x1:x2])
+            
+            # Try to detect numbers and volta notation, OCRing all brackets together
+            if self.ocr_available:
+                # Allow numbers, periods, commas, dashes for volta notation
+                texts = self._ocr_strings(regions, psm=7, whitelist='0123456789.,-')
+                
+                for (x1, y1, x2), text in zip(brackets, texts):
+                    text = text.strip()
+                    if text and any(c.isdigit() for c in text):
+                        endings.append({
+                            'type': 'alternate_ending',
+                            'volta_text': text,  # e.g., "1.", "2.", "1,2", "1-3"
+                            'x': x1,
+                            'y': y1,
+                            'width': x2 - x1,
+                            'bracket_type': 'volta',
+                            'description': f'Take this ending when playing ending {text}',
+                            'confidence': 0.85,
+                            'detection_method': 'bracket_and_OCR'
+                        })
+            else:
+                # Fallback: just note that a bracket was found
+                for x1, y1, x2 in brackets:
+                    endings.append({
+                        'type': 'alternate_ending',
+                        'volta_text': 'unknown',
+                        'x': x1,
+                        'y': y1,
+                        'width': x2 - x1,
+                        'bracket_type': 'volta',
+                        'description': 'Alternate ending bracket detected',
+                        'confidence': 0.6,
+                        'detection_method': 'bracket_only'
+                    })
+            
         except Exception as e:
             self.logger.warning(f"Alternate ending detection error: {e}")
         
         return endings
     
-    def _detect_articulations(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_articulations(self, gray: np.ndarray,
+                              ocr_data: Optional[Dict[str, List]] = None,
+                              binary_inv: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Detect articulations (accents, staccato, tenuto, fermata, etc.)
         Enhanced version beyond what OEMER provides
+        
+        Marks are classified from the connected components of the Otsu
+        binarization. Components inside words the page OCR recognized are
+        dynamics or expression text, so they are dropped first.
+        
+        Args:
+            gray: Grayscale page image
+            ocr_data: Word-level data from the shared page OCR pass
+            binary_inv: Otsu binarization of the page (computed here if not given)
+            
+        Returns:
+            Detection array (DET_DTYPE) with the articulation as subtype
         """
-        articulations = []
+        articulations = make_detections([], [], [], [], [], [], 'shape_analysis')
         
         try:
-            # Apply morphological operations to enhance small marks
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-            
             # Threshold
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            thresh = binary_inv if binary_inv is not None else self._binarize(gray)
             
-            # Find small connected components (potential articulation marks)
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Find connected components (potential articulation marks); areas and
+            # bounding boxes come back as arrays so classification is vectorized
+            _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8, ltype=cv2.CV_32S)
+            
+            # Skip label 0 (background)
+            stats = stats[1:]
+            if ocr_data is not None:
+                stats = stats[~self._inside_ocr_words(stats, ocr_data)]
+            
+            articulations = self._classify_articulations(
+                stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP],
+                stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT],
+                stats[:, cv2.CC_STAT_AREA], 'shape_analysis'
+            )
             
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                
-                # Articulation marks are small (20-200 pixels typically)
-                if 20 < area < 200:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    aspect_ratio = w / float(h) if h > 0 else 0
-                    
-                    # Classify based on shape characteristics
-                    articulation_type = 'unknown'
-                    
-                    if 0.8 < aspect_ratio < 1.2 and area < 50:
-                        # Likely staccato dot (circular, small)
-                        articulation_type = 'staccato'
-                    elif aspect_ratio > 2.0 and h < 10:
-                        # Likely tenuto (horizontal line)
-                        articulation_type = 'tenuto'
-                    elif aspect_ratio < 0.5 and area < 100:
-                        # Vertical-ish shape, possibly accent
-                        articulation_type = 'accent'
-                    
-                    if articulation_type != 'unknown':
-                        articulations.append({
-                            'type': 'articulation',
-                            'marking': articulation_type,
-                            'x': x,
-                            'y': y,
-                            'width': w,
-                            'height': h,
-                            'confidence': 0.7,
-                            'detection_method': 'shape_analysis'
-                        })
-                        
         except Exception as e:
             self.logger.warning(f"Articulation detection error: {e}")
         
         return articulations
     
-    def _detect_repeat_signs(self, gray: np.ndarray, img: np.ndarray) -> List[Dict[str, Any]]:
+    def _inside_ocr_words(self, stats: np.ndarray, ocr_data: Dict[str, List]) -> np.ndarray:
+        """
+        Mask of the components whose centre falls inside a recognized word
+        
+        Args:
+            stats: Component stats rows from connectedComponentsWithStats
+            ocr_data: Word-level data from the shared page OCR pass
+            
+        Returns:
+            Boolean array, one entry per component
+        """
+        words = np.array([bool(text.strip()) for text in ocr_data['text']], dtype=bool)
+        if not words.any():
+            return np.zeros(len(stats), dtype=bool)
+        
+        left = np.asarray(ocr_data['left'], dtype=np.int32)[words]
+        top = np.asarray(ocr_data['top'], dtype=np.int32)[words]
+        right = left + np.asarray(ocr_data['width'], dtype=np.int32)[words]
+        bottom = top + np.asarray(ocr_data['height'], dtype=np.int32)[words]
+        
+        cx = (stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH] // 2)[:, None]
+        cy = (stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT] // 2)[:, None]
+        inside = (cx >= left) & (cx < right) & (cy >= top) & (cy < bottom)
+        return inside.any(axis=1)
+    
+    def _classify_articulations(self, xs: np.ndarray, ys: np.ndarray, ws: np.ndarray,
+                                hs: np.ndarray, areas: np.ndarray,
+                                detection_method: str) -> np.ndarray:
+        """
+        Classify candidate marks by size and aspect ratio
+        
+        Args:
+            xs, ys, ws, hs: Bounding boxes of the candidates
+            areas: Pixel area of each candidate
+            detection_method: Source of the candidates, recorded on each result
+            
+        Returns:
+            Detection array (DET_DTYPE) with the articulation as subtype
+        """
+        t = self.thresholds
+        aspect_ratio = ws / np.maximum(hs, 1).astype(np.float32)
+        
+        # Articulation marks are small (20-200 pixels typically at 300 DPI)
+        small = (areas > t.mark_min_area) & (areas < t.mark_max_area)
+        
+        # Classify based on shape characteristics (first match wins)
+        # Likely staccato dot (circular, small)
+        staccato = small & (aspect_ratio > 0.8) & (aspect_ratio < 1.2) & (areas < t.staccato_max_area)
+        # Likely tenuto (horizontal line)
+        tenuto = small & ~staccato & (aspect_ratio > 2.0) & (hs < t.tenuto_max_height)
+        # Vertical-ish shape, possibly accent
+        accent = small & ~staccato & ~tenuto & (aspect_ratio < 0.5) & (areas < t.accent_max_area)
+        
+        # Masks are disjoint, so one selection keeps the candidates in page order
+        subtypes = np.select([staccato, tenuto, accent], ['staccato', 'tenuto', 'accent'], '')
+        keep = subtypes != ''
+        return make_detections(xs[keep], ys[keep], ws[keep], hs[keep], 0.7,
+                               subtypes[keep], detection_method)
+    
+    def _detect_repeat_signs(self, gray: np.ndarray, ocr_text: str,
+                             lines: Optional[np.ndarray]) -> List[Dict[str, Any]]:
         """
         Detect repeat signs, D.C., D.S., Coda, Segno symbols
         """
@@ -452,46 +1002,32 @@ class AdvancedNotationDetector:
             # Look for double barlines with dots (repeat signs)
             # These appear as thick vertical lines with dots
             
-            # Detect vertical lines
-            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=100,
-                                   minLineLength=50, maxLineGap=5)
-            
+            # Nearly vertical lines (filtered in _detect_lines)
             if lines is not None:
                 for line in lines:
                     x1, y1, x2, y2 = line[0]
                     
-                    # Check if line is mostly vertical
-                    angle = np.abs(np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi)
-                    if 80 < angle < 100:  # Nearly vertical
-                        # Look for dots near this line
-                        # Repeat signs have dots on both sides of the barline
-                        repeats.append({
-                            'type': 'repeat_sign',
-                            'subtype': 'barline',
-                            'x': x1,
-                            'y': y1,
-                            'confidence': 0.65,
-                            'detection_method': 'line_detection'
-                        })
+                    # Look for dots near this line
+                    # Repeat signs have dots on both sides of the barline
+                    repeats.append({
+                        'type': 'repeat_sign',
+                        'subtype': 'barline',
+                        'x': int(x1),
+                        'y': int(y1),
+                        'confidence': 0.65,
+                        'detection_method': 'line_detection'
+                    })
             
-            # Look for text markers (D.C., D.S., Fine, Coda)
-            try:
-                import pytesseract
-                text = pytesseract.image_to_string(gray).lower()
-                
-                markers = ['d.c.', 'd.s.', 'fine', 'coda', 'segno', 'to coda']
-                for marker in markers:
-                    if marker in text:
-                        repeats.append({
-                            'type': 'repeat_sign',
-                            'subtype': 'text_marker',
-                            'text': marker,
-                            'confidence': 0.8,
-                            'detection_method': 'OCR'
-                        })
-            except ImportError:
-                pass
+            # Look for text markers (D.C., D.S., Fine, Coda) in the page OCR
+            for marker in REPEAT_TEXT_MARKERS:
+                if marker in ocr_text:
+                    repeats.append({
+                        'type': 'repeat_sign',
+                        'subtype': 'text_marker',
+                        'text': marker,
+                        'confidence': 0.8,
+                        'detection_method': 'OCR'
+                    })
                 
         except Exception as e:
             self.logger.warning(f"Repeat sign detection error: {e}")
@@ -501,9 +1037,14 @@ class AdvancedNotationDetector:
     def cleanup(self):
         """Clean up temporary files"""
         try:
-            if os.path.exists(self.temp_dir):
-                import shutil
-                shutil.rmtree(self.temp_dir)
+            if getattr(self, '_tess_api', None) is not None:
+                self._tess_api.End()
+                self._tess_api = None
+            
+            temp_dir = getattr(self, '_temp_dir', None)
+            if temp_dir is not None:
+                self._temp_dir = None
+                shutil.rmtree(temp_dir, ignore_errors=True)
                 self.logger.info("Cleaned up temporary files")
         except Exception as e:
             self.logger.warning(f"Failed to cleanup temp directory: {e}")
@@ -4,16 +4,15 @@ Uses deep learning models for accurate sheet music recognition
 """
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 import numpy as np
 import cv2
-from PIL import Image
 import fitz  # PyMuPDF
 
 try:
     import torch
     import torch.nn as nn
-    from torchvision import transforms
     TORCH_AVAILABLE = True
 except ImportError:
     TORCH_AVAILABLE = False
@@ -24,25 +23,109 @@ try:
 except ImportError:
     TRANSFORMERS_AVAILABLE = False
 
+from src.numba_compat import njit
+
 logger = logging.getLogger(__name__)
 
+# Input size of the neural symbol classifier
+SYMBOL_INPUT_SIZE = 64
+
+# Output classes of the neural symbol classifier, by logit index
+NEURAL_SYMBOL_TYPES = (
+    'note_whole', 'note_half', 'note_quarter', 'note_eighth', 'note_sixteenth',
+    'rest', 'note_head', 'unknown'
+)
+
+# Duration in beats of each note symbol
+NOTE_DURATIONS = {
+    'note_whole': 4.0,
+    'note_half': 2.0,
+    'note_quarter': 1.0,
+    'note_eighth': 0.5,
+    'note_sixteenth': 0.25
+}
+
+# Shortest duration (in beats) of each rhythm type after the first
+RHYTHM_DURATION_BOUNDARIES = np.array([0.375, 0.75, 1.5, 3.5])
+RHYTHM_TYPES = np.array(['sixteenth', 'eighth', 'quarter', 'half', 'whole'])
+
+# Half-line steps below the bottom staff line covered by the note mapping (-2 lines)
+NOTE_LUT_OFFSET = 4
+
+# Labels returned by classify_symbols_heuristic, by index
+HEURISTIC_SYMBOL_TYPES = ('note_quarter', 'note_half', 'rest', 'note_head', 'unknown')
+
+
+@njit(cache=True)
+def classify_symbols_heuristic(rects: np.ndarray):
+    """
+    Classify symbol bounding boxes by shape
+    
+    Args:
+        rects: (N, 4) int32 array of x, y, width, height
+        
+    Returns:
+        Index into HEURISTIC_SYMBOL_TYPES and confidence for each box
+    """
+    n = rects.shape[0]
+    types = np.empty(n, dtype=np.int8)
+    confidences = np.empty(n, dtype=np.float64)
+    
+    for i in range(n):
+        w = rects[i, 2]
+        h = rects[i, 3]
+        aspect_ratio = h / w if w > 0 else 0.0
+        
+        # Simple heuristics based on shape
+        if 1.5 < aspect_ratio < 3.5:
+            # Likely a note
+            if h > w * 2:
+                types[i], confidences[i] = 0, 0.7    # note_quarter
+            else:
+                types[i], confidences[i] = 1, 0.7    # note_half
+        elif aspect_ratio < 0.5:
+            # Wide symbol - might be a rest or accidental
+            types[i], confidences[i] = 2, 0.6        # rest
+        elif 0.8 < aspect_ratio < 1.2:
+            # Square-ish - might be note head
+            types[i], confidences[i] = 3, 0.6        # note_head
+        else:
+            types[i], confidences[i] = 4, 0.3        # unknown
+    
+    return types, confidences
+
 
 class StaffDetector:
     """Detects and extracts staff lines using computer vision"""
     
-    def __init__(self):
+    def __init__(self, downsample: int = 3):
+        """
+        Initialize the staff detector
+        
+        Args:
+            downsample: Factor to shrink pages by before looking for staff
+                        lines (pages are rendered at 3x zoom); coordinates
+                        are reported at full resolution
+        """
         self.staff_line_height = 10
         self.staff_space_height = 10
+        self.downsample = max(1, int(downsample))
     
     def detect_staves(self, image: np.ndarray) -> List[Dict[str, Any]]:
         """Detect all staff systems in the image"""
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
         
+        # Staff lines span most of the page, so they survive downsampling;
+        # the morphology below then touches 1/downsample^2 of the pixels
+        scale = self.downsample
+        if scale > 1:
+            gray = cv2.resize(gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+        
         # Apply binary threshold
         _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
         
-        # Detect horizontal lines (staff lines)
-        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
+        # Detect horizontal lines (staff lines); 40px at full resolution
+        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, round(40 / scale)), 1))
         detect_horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
         
         # Find contours
@@ -52,30 +135,35 @@ class StaffDetector:
         staff_lines = []
         for contour in contours:
             x, y, w, h = cv2.boundingRect(contour)
-            if w > image.shape[1] * 0.5:  # Line should span at least 50% of width
-                staff_lines.append({'y': y, 'x': x, 'width': w, 'height': h})
+            if w > gray.shape[1] * 0.5:  # Line should span at least 50% of width
+                # Back to full-resolution coordinates
+                staff_lines.append({'y': y * scale, 'x': x * scale, 'width': w * scale, 'height': h * scale})
         
         # Sort by y-coordinate
         staff_lines.sort(key=lambda l: l['y'])
         
+        if len(staff_lines) < 5:
+            return []
+        
+        # Score every run of 5 consecutive lines at once: window i holds the
+        # 4 spacings between lines i..i+4
+        y_positions = np.fromiter((l['y'] for l in staff_lines), dtype=np.float64, count=len(staff_lines))
+        spacings = np.lib.stride_tricks.sliding_window_view(np.diff(y_positions), 4)
+        avg_spacings = spacings.mean(axis=1)
+        consistent = spacings.std(axis=1) < avg_spacings * 0.3  # Consistent spacing
+        
         # Group into staves
         staves = []
         i = 0
         while i < len(staff_lines) - 4:
             # Check if next 5 lines form a staff
-            lines_group = staff_lines[i:i+5]
-            y_positions = [l['y'] for l in lines_group]
-            
-            # Check spacing consistency
-            spacings = [y_positions[j+1] - y_positions[j] for j in range(4)]
-            avg_spacing = np.mean(spacings)
-            
-            if np.std(spacings) < avg_spacing * 0.3:  # Consistent spacing
+            if consistent[i]:
+                lines_group = staff_lines[i:i+5]
                 staff = {
                     'lines': lines_group,
-                    'top': y_positions[0],
-                    'bottom': y_positions[4],
-                    'line_spacing': avg_spacing
+                    'top': lines_group[0]['y'],
+                    'bottom': lines_group[4]['y'],
+                    'line_spacing': float(avg_spacings[i])
                 }
                 staves.append(staff)
                 i += 5
@@ -88,10 +176,18 @@ class StaffDetector:
 class NeuralOMR:
     """Advanced neural network-based OMR system"""
     
-    def __init__(self):
+    def __init__(self, use_int8: bool = True):
+        """
+        Initialize the neural OMR system
+        
+        Args:
+            use_int8: Quantize the classifier's linear layers to INT8 for CPU
+                      inference (disable to compare accuracy)
+        """
         self.logger = logger
         self.staff_detector = StaffDetector()
         self.model = None
+        self.use_int8 = use_int8
         
         # Initialize model if available
         if TORCH_AVAILABLE:
@@ -104,12 +200,10 @@ class NeuralOMR:
             # For now, we'll create a placeholder architecture
             self.logger.info("Initializing neural OMR model")
             
-            # Define transform for preprocessing
-            self.transform = transforms.Compose([
-                transforms.Resize((64, 64)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.5], std=[0.5])
-            ])
+            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            
+            if self.model is not None:
+                self.model = self._optimize_model(self.model)
             
             self.logger.info("Neural OMR model initialized")
             
@@ -117,6 +211,22 @@ class NeuralOMR:
             self.logger.warning(f"Could not initialize neural model: {e}")
             self.model = None
     
+    def _optimize_model(self, model: 'nn.Module') -> 'nn.Module':
+        """
+        Prepare a loaded classifier for inference
+        
+        On CPU the linear layers are dynamically quantized to INT8 (weights
+        stored as qint8, activations quantized per batch). Dynamic
+        quantization has no Conv2d kernels, so convolutions stay in float.
+        """
+        model = model.eval().to(self.device)
+        
+        if self.use_int8 and self.device.type == 'cpu':
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+            self.logger.info("Quantized neural OMR classifier to INT8")
+        
+        return model
+    
     def recognize_symbols(self, image: np.ndarray, staff_info: Dict) -> List[Dict]:
         """
         Recognize musical symbols within a staff using AI
@@ -133,16 +243,14 @@ class NeuralOMR:
         # Extract regions of interest
         rois = self._extract_symbol_regions(image, staff_info)
         
-        for roi_info in rois:
-            roi_image = roi_info['image']
-            
-            # Use neural network to classify symbol
-            if self.model and TORCH_AVAILABLE:
-                symbol_type, confidence = self._classify_symbol_neural(roi_image)
-            else:
-                # Fallback to heuristic-based recognition
-                symbol_type, confidence = self._classify_symbol_heuristic(roi_image, roi_info)
-            
+        # Use neural network to classify symbol
+        if self.model and TORCH_AVAILABLE:
+            results = self._classify_symbols_neural(rois)
+        else:
+            # Fallback to heuristic-based recognition of all regions at once
+            results = self._classify_symbols_heuristic(rois)
+        
+        for roi_info, (symbol_type, confidence) in zip(rois, results):
             if confidence > 0.5:
                 symbols.append({
                     'type': symbol_type,
@@ -158,76 +266,74 @@ class NeuralOMR:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
         _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
         
-        # Find connected components
-        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Find connected components; their bounding boxes come back as one array
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8, ltype=cv2.CV_32S)
+        
+        # Skip label 0 (background)
+        rects = stats[1:, :4]
+        ws, hs = rects[:, 2], rects[:, 3]
+        
+        # Filter by size (should be symbol-sized)
+        symbol_sized = (ws > 5) & (ws < 100) & (hs > 5) & (hs < 150)
+        
+        # Calculate position relative to staff
+        staff_top = staff_info.get('top', 0)
+        staff_spacing = staff_info.get('line_spacing', 10)
         
         rois = []
-        for contour in contours:
-            x, y, w, h = cv2.boundingRect(contour)
+        for x, y, w, h in rects[symbol_sized].tolist():
+            roi = gray[y:y+h, x:x+w]
             
-            # Filter by size (should be symbol-sized)
-            if 5 < w < 100 and 5 < h < 150:
-                roi = gray[y:y+h, x:x+w]
-                
-                # Calculate position relative to staff
-                staff_top = staff_info.get('top', 0)
-                staff_spacing = staff_info.get('line_spacing', 10)
-                
-                # Determine line/space position
-                relative_y = y - staff_top
-                line_position = relative_y / staff_spacing
-                
-                rois.append({
-                    'image': roi,
-                    'bbox': (x, y, w, h),
-                    'position': {
-                        'x': x,
-                        'line': line_position
-                    }
-                })
+            # Determine line/space position
+            relative_y = y - staff_top
+            line_position = relative_y / staff_spacing
+            
+            rois.append({
+                'image': roi,
+                'bbox': (x, y, w, h),
+                'position': {
+                    'x': x,
+                    'line': line_position
+                }
+            })
         
         return rois
     
-    def _classify_symbol_neural(self, roi: np.ndarray) -> Tuple[str, float]:
-        """Classify symbol using neural network"""
+    def _classify_symbols_neural(self, rois: List[Dict]) -> List[Tuple[str, float]]:
+        """Classify all symbols of a staff with one batched forward pass"""
+        if not rois:
+            return []
+        
         try:
-            # Convert to PIL Image
-            if len(roi.shape) == 2:
-                roi_pil = Image.fromarray(roi).convert('L')
-            else:
-                roi_pil = Image.fromarray(roi)
+            # Preprocess every region into one [N, 1, 64, 64] batch: resize on
+            # the host, copy once, then scale to [-1, 1] in place on the device
+            resized = np.stack([
+                cv2.resize(roi_info['image'], (SYMBOL_INPUT_SIZE, SYMBOL_INPUT_SIZE),
+                           interpolation=cv2.INTER_AREA)
+                for roi_info in rois
+            ])
+            batch = torch.from_numpy(resized).to(self.device).unsqueeze(1).float()
+            batch.div_(255.0).sub_(0.5).div_(0.5)
             
-            # Preprocess
-            tensor = self.transform(roi_pil).unsqueeze(0)
+            with torch.inference_mode():
+                logits = self.model(batch.to(self.device))
+            confidences, indices = logits.softmax(dim=-1).max(dim=-1)
             
-            # In production, would use actual trained model
-            # For demo, return placeholder
-            return 'note_quarter', 0.85
+            return [(NEURAL_SYMBOL_TYPES[i], c) for i, c in zip(indices.tolist(), confidences.tolist())]
             
         except Exception as e:
             self.logger.warning(f"Neural classification failed: {e}")
-            return 'unknown', 0.0
+            return [('unknown', 0.0)] * len(rois)
     
-    def _classify_symbol_heuristic(self, roi: np.ndarray, roi_info: Dict) -> Tuple[str, float]:
-        """Classify symbol using heuristic rules"""
-        h, w = roi.shape[:2]
-        aspect_ratio = h / w if w > 0 else 0
+    def _classify_symbols_heuristic(self, rois: List[Dict]) -> List[Tuple[str, float]]:
+        """Classify symbols using heuristic rules on their bounding boxes"""
+        if not rois:
+            return []
         
-        # Simple heuristics based on shape
-        if 1.5 < aspect_ratio < 3.5:
-            # Likely a note
-            if h > w * 2:
-                return 'note_quarter', 0.7
-            else:
-                return 'note_half', 0.7
-        elif aspect_ratio < 0.5:
-            # Wide symbol - might be a rest or accidental
-            return 'rest', 0.6
-        elif 0.8 < aspect_ratio < 1.2:
-            # Square-ish - might be note head
-            return 'note_head', 0.6
+        rects = np.array([roi_info['bbox'] for roi_info in rois], dtype=np.int32)
+        types, confidences = classify_symbols_heuristic(rects)
         
-        return 'unknown', 0.3
+        return [(HEURISTIC_SYMBOL_TYPES[t], c) for t, c in zip(types.tolist(), confidences.tolist())]
 
 
 class AIOMRSystem:
@@ -237,6 +343,13 @@ class AIOMRSystem:
         self.logger = logger
         self.neural_omr = NeuralOMR()
         self.note_mapping = self._initialize_note_mapping()
+        
+        # The mapping covers half-line steps from -2 to 6: index it directly by
+        # round(2 * position) + NOTE_LUT_OFFSET (gaps keep the 'C4' default)
+        self._note_lut = tuple(
+            self.note_mapping.get(i / 2, 'C4')
+            for i in range(-NOTE_LUT_OFFSET, 2 * int(max(self.note_mapping)) + 1)
+        )
     
     def _initialize_note_mapping(self) -> Dict[float, str]:
         """Map staff line positions to note names"""
@@ -272,8 +385,9 @@ class AIOMRSystem:
         try:
             self.logger.info(f"Starting AI-powered OMR analysis: {pdf_path}")
             
-            # Extract pages as images
-            images = self._extract_pdf_pages(pdf_path)
+            # Extract pages as images; the images view the pixmaps' memory, so
+            # the pixmaps are held until the analysis is done
+            images, _pixmaps = self._extract_pdf_pages(pdf_path)
             
             all_notes = []
             all_metadata = {
@@ -285,24 +399,18 @@ class AIOMRSystem:
             
             cumulative_time = 0.0
             
-            for page_idx, image in enumerate(images):
+            # Pages are independent until their notes are placed in time, and
+            # OpenCV releases the GIL, so the per-page vision work runs on threads
+            workers = max(1, min(len(images), os.cpu_count() or 1))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mugic-omr-page') as executor:
+                pages = list(executor.map(self._process_page, images))
+            
+            for page_idx, (staves, symbols_per_staff) in enumerate(pages):
                 self.logger.info(f"Analyzing page {page_idx + 1}/{len(images)}")
-                
-                # Detect staves
-                staves = self.neural_omr.staff_detector.detect_staves(image)
                 self.logger.info(f"Detected {len(staves)} staves on page {page_idx + 1}")
                 
-                # Analyze each staff
-                for staff_idx, staff in enumerate(staves):
-                    # Extract staff region
-                    y_start = max(0, staff['top'] - 20)
-                    y_end = min(image.shape[0], staff['bottom'] + 20)
-                    staff_image = image[y_start:y_end, :]
-                    
-                    # Recognize symbols
-                    symbols = self.neural_omr.recognize_symbols(staff_image, staff)
-                    
-                    # Convert symbols to notes
+                # Convert each staff's symbols to notes, continuing from the previous staff
+                for symbols in symbols_per_staff:
                     notes = self._symbols_to_notes(symbols, cumulative_time, all_metadata)
                     all_notes.extend(notes)
                     
@@ -322,7 +430,7 @@ class AIOMRSystem:
                 'tempo': all_metadata['tempo'],
                 'clef': all_metadata['clef'],
                 'num_pages': len(images),
-                'num_staves': sum(len(self.neural_omr.staff_detector.detect_staves(img)) for img in images),
+                'num_staves': sum(len(staves) for staves, _ in pages),
                 'total_measures': self._estimate_measures(all_notes, all_metadata['time_signature']),
                 'confidence': self._calculate_confidence(all_notes),
                 'analysis_method': 'AI-powered neural OMR'
@@ -335,9 +443,40 @@ class AIOMRSystem:
             self.logger.error(f"Error in OMR analysis: {str(e)}")
             raise
     
-    def _extract_pdf_pages(self, pdf_path: str) -> List[np.ndarray]:
-        """Extract all pages from PDF as high-resolution images"""
+    def _process_page(self, image: np.ndarray) -> Tuple[List[Dict], List[List[Dict]]]:
+        """
+        Detect the staves of a page and recognize the symbols on each
+        
+        Args:
+            image: Grayscale page image
+            
+        Returns:
+            The page's staves and the symbols recognized on each staff
+        """
+        staves = self.neural_omr.staff_detector.detect_staves(image)
+        
+        symbols_per_staff = []
+        for staff in staves:
+            # Extract staff region
+            y_start = max(0, staff['top'] - 20)
+            y_end = min(image.shape[0], staff['bottom'] + 20)
+            staff_image = image[y_start:y_end, :]
+            
+            # Recognize symbols
+            symbols_per_staff.append(self.neural_omr.recognize_symbols(staff_image, staff))
+        
+        return staves, symbols_per_staff
+    
+    def _extract_pdf_pages(self, pdf_path: str) -> Tuple[List[np.ndarray], List[Any]]:
+        """
+        Extract all pages from PDF as high-resolution grayscale images
+        
+        Returns:
+            Page images and the pixmaps whose memory they view (keep these
+            alive for as long as the images are used)
+        """
         images = []
+        pixmaps = []
         
         try:
             pdf_document = fitz.open(pdf_path)
@@ -345,18 +484,23 @@ class AIOMRSystem:
             for page_num in range(len(pdf_document)):
                 page = pdf_document[page_num]
                 
-                # Render at high resolution for better OCR
+                # Render at high resolution for better OCR; every stage works on
+                # grayscale, so render one channel instead of converting RGB later
                 mat = fitz.Matrix(3.0, 3.0)  # 3x zoom
-                pix = page.get_pixmap(matrix=mat)
+                pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
                 
-                # Convert to numpy array
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                img_array = np.array(img)
+                # View the pixmap's own buffer (samples_mv; pix.samples would
+                # copy it into a new bytes object); drop row padding only if
+                # the pixmap has any
+                img_array = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+                if pix.stride != pix.width:
+                    img_array = img_array[:, :pix.width]
                 
                 images.append(img_array)
+                pixmaps.append(pix)
             
             pdf_document.close()
-            return images
+            return images, pixmaps
             
         except Exception as e:
             self.logger.error(f"Error extracting PDF pages: {str(e)}")
@@ -400,25 +544,17 @@ class AIOMRSystem:
     def _line_position_to_note(self, line_position: float) -> str:
         """Convert staff line position to note name"""
         # Round to nearest half-step
-        rounded = round(line_position * 2) / 2
+        index = round(line_position * 2) + NOTE_LUT_OFFSET
         
-        # Get from mapping or interpolate
-        if rounded in self.note_mapping:
-            return self.note_mapping[rounded]
+        if 0 <= index < len(self._note_lut):
+            return self._note_lut[index]
         
         # Default to middle C if out of range
         return 'C4'
     
     def _get_note_duration(self, note_type: str, time_signature: str) -> float:
         """Get duration in beats for note type"""
-        durations = {
-            'note_whole': 4.0,
-            'note_half': 2.0,
-            'note_quarter': 1.0,
-            'note_eighth': 0.5,
-            'note_sixteenth': 0.25
-        }
-        return durations.get(note_type, 1.0)
+        return NOTE_DURATIONS.get(note_type, 1.0)
     
     def _extract_metadata(self, image: np.ndarray, first_staff: Dict) -> Dict[str, Any]:
         """Extract musical metadata from the first staff"""
@@ -433,30 +569,16 @@ class AIOMRSystem:
     
     def _extract_rhythm_info(self, notes: List[Dict]) -> List[Dict]:
         """Extract rhythm information from notes"""
-        rhythms = []
+        durations = np.fromiter((n['duration'] for n in notes), dtype=np.float64, count=len(notes))
         
-        for note in notes:
-            duration = note['duration']
-            
-            # Classify rhythm type
-            if duration >= 3.5:
-                rhythm_type = 'whole'
-            elif duration >= 1.5:
-                rhythm_type = 'half'
-            elif duration >= 0.75:
-                rhythm_type = 'quarter'
-            elif duration >= 0.375:
-                rhythm_type = 'eighth'
-            else:
-                rhythm_type = 'sixteenth'
-            
-            rhythms.append({
-                'type': rhythm_type,
-                'duration': duration,
-                'start_time': note['start_time']
-            })
+        # Classify rhythm types; each boundary belongs to the longer type
+        rhythm_types = RHYTHM_TYPES[np.searchsorted(RHYTHM_DURATION_BOUNDARIES, durations, side='right')]
         
-        return rhythms
+        return [{
+            'type': rhythm_type,
+            'duration': note['duration'],
+            'start_time': note['start_time']
+        } for note, rhythm_type in zip(notes, rhythm_types.tolist())]
     
     def _estimate_measures(self, notes: List[Dict], time_signature: str) -> int:
         """Estimate number of measures"""
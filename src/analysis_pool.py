@@ -0,0 +1,126 @@
+"""
+Analysis Pool - Runs OMR and audio transcription in worker processes
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from src.components import get_omr_system, get_audio_analyzer, get_feedback_generator
+
+logger = logging.getLogger(__name__)
+
+
+def _default_pool_size() -> int:
+    """Split the cores between the gunicorn workers that each own a pool"""
+    cpu_count = os.cpu_count() or 1
+    web_workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count))
+    return max(1, cpu_count // max(1, web_workers))
+
+
+def _init_worker():
+    """Load the OMR engine, audio analyzer and feedback LLM once per worker process"""
+    logging.basicConfig(level=logging.INFO)
+    get_omr_system()
+    get_audio_analyzer()
+    get_feedback_generator()
+
+
+def _analyze_sheet_music(pdf_path: str) -> Dict[str, Any]:
+    """Run OMR inside a worker process"""
+    return get_omr_system().analyze_sheet_music(pdf_path)
+
+
+def _analyze_audio_batch(
+    audio_paths: List[str],
+    instruments: List[str],
+    apply_noise_reduction: bool
+) -> List[Dict[str, Any]]:
+    """Run batched audio transcription inside a worker process"""
+    return get_audio_analyzer().analyze_batch(audio_paths, instruments, apply_noise_reduction=apply_noise_reduction)
+
+
+def _generate_feedback(
+    sheet_music_analysis: Dict[str, Any],
+    audio_analysis: Dict[str, Any],
+    disable_dynamics: bool
+) -> Dict[str, Any]:
+    """Run LLM feedback generation inside a worker process"""
+    return get_feedback_generator().generate_feedback(
+        sheet_music_analysis=sheet_music_analysis,
+        audio_analysis=audio_analysis,
+        disable_dynamics=disable_dynamics
+    )
+
+
+class AnalysisPool:
+    """
+    Process pool for the CPU-heavy analysis steps
+
+    Each worker process has its own interpreter, so OMR post-processing, audio
+    transcription and LLM feedback for different requests no longer contend
+    for the GIL of the web worker (whose gevent "threads" all share one OS thread). Set ANALYSIS_PROCESSES=0 to run in-process instead.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the analysis pool
+
+        Args:
+            max_workers: Number of worker processes (defaults to
+                         ANALYSIS_PROCESSES or this web worker's share of the cores)
+        """
+        self.logger = logger
+        if max_workers is None:
+            max_workers = int(os.environ.get('ANALYSIS_PROCESSES', _default_pool_size()))
+        self.max_workers = max_workers
+
+        self.executor = None
+        if max_workers > 0:
+            # spawn keeps gevent's monkey-patching and open DB connections out of the workers
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            self.logger.info(f"Analysis pool started with {max_workers} worker processes")
+
+    def warm_up(self):
+        """Start the worker processes (or load the components in-process)"""
+        if self.executor is None:
+            _init_worker()
+        else:
+            # Each pending no-op spawns a worker and runs its initializer, so submit
+            # one per worker before waiting on any of them
+            futures = [self.executor.submit(os.getpid) for _ in range(self.max_workers)]
+            pids = {future.result() for future in futures}
+            self.logger.info(f"Analysis pool warmed up {len(pids)} worker processes")
+
+    def analyze_sheet_music(self, pdf_path: str) -> Dict[str, Any]:
+        """Analyze a sheet music PDF with the configured OMR engine"""
+        if self.executor is None:
+            return _analyze_sheet_music(pdf_path)
+        return self.executor.submit(_analyze_sheet_music, pdf_path).result()
+
+    def analyze_batch(
+        self,
+        audio_paths: List[str],
+        instruments: List[str],
+        apply_noise_reduction: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Transcribe a batch of recordings with the configured audio analyzer"""
+        if self.executor is None:
+            return _analyze_audio_batch(audio_paths, instruments, apply_noise_reduction)
+        return self.executor.submit(_analyze_audio_batch, audio_paths, instruments, apply_noise_reduction).result()
+
+    def generate_feedback(
+        self,
+        sheet_music_analysis: Dict[str, Any],
+        audio_analysis: Dict[str, Any],
+        disable_dynamics: bool = False
+    ) -> Dict[str, Any]:
+        """Generate performance feedback with the configured feedback generator"""
+        if self.executor is None:
+            return _generate_feedback(sheet_music_analysis, audio_analysis, disable_dynamics)
+        return self.executor.submit(_generate_feedback, sheet_music_analysis, audio_analysis, disable_dynamics).result()
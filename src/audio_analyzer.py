@@ -6,10 +6,32 @@ import numpy as np
 import librosa
 import soundfile as sf
 import noisereduce as nr
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+from src.note_alignment import hz_to_names
 
 logger = logging.getLogger(__name__)
 
+# Noise reduction strength: noisy bins keep at least 1 - 0.8 of their energy
+NOISE_PROP_DECREASE = 0.8
+
+# RMS level (dB relative to the loudest frame) boundaries between dynamic levels
+DYNAMIC_DB_BOUNDARIES = np.array([-50, -40, -30, -20, -10])
+DYNAMIC_LEVELS = np.array([
+    'pp',  # pianissimo
+    'p',   # piano
+    'mp',  # mezzo-piano
+    'mf',  # mezzo-forte
+    'f',   # forte
+    'ff'   # fortissimo
+])
+
 
 class AudioAnalyzer:
     """Analyzes recorded audio and extracts musical features"""
@@ -18,6 +40,11 @@ class AudioAnalyzer:
         """Initialize the audio analyzer"""
         self.logger = logger
         self.sample_rate = 22050  # Standard sample rate for music analysis
+        self.n_fft = 2048
+        self.hop_length = 512
+        
+        # Spectral gating runs on the GPU when one is available
+        self.cuda_available = TORCH_AVAILABLE and torch.cuda.is_available()
     
     def analyze(
         self,
@@ -40,17 +67,20 @@ class AudioAnalyzer:
             self.logger.info(f"Starting audio analysis of {audio_path}")
             
             # Load audio file
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate)
+            audio, sr = self._load_audio(audio_path)
             
             # Apply noise reduction if requested
             if apply_noise_reduction:
                 audio = self._reduce_noise(audio, sr)
             
-            # Extract musical features
-            pitches = self._extract_pitches(audio, sr)
-            onsets = self._detect_note_onsets(audio, sr)
-            tempo = self._estimate_tempo(audio, sr)
-            dynamics = self._analyze_dynamics(audio, sr)
+            # One STFT feeds the onset, tempo and dynamics features
+            spectral = self._compute_spectral_features(audio, sr)
+            
+            # Extract musical features (frame-level tracks as arrays)
+            pitches = self._extract_pitches(audio, sr, spectral['times'])
+            onsets = self._detect_note_onsets(spectral['onset_envelope'], sr)
+            tempo = self._estimate_tempo(spectral['beat_envelope'], sr)
+            dynamics = self._analyze_dynamics(spectral['magnitude'], spectral['times'])
             rhythm = self._analyze_rhythm(audio, sr, onsets)
             
             # Match notes with instrument characteristics
@@ -59,9 +89,9 @@ class AudioAnalyzer:
             analysis = {
                 'notes': notes,
                 'tempo': tempo,
-                'dynamics': dynamics,
+                'dynamics': self._dynamics_to_dicts(dynamics),
                 'rhythm': rhythm,
-                'pitches': pitches,
+                'pitches': self._pitches_to_dicts(pitches),
                 'onsets': onsets,
                 'duration': len(audio) / sr,
                 'instrument': instrument
@@ -74,8 +104,56 @@ class AudioAnalyzer:
             self.logger.error(f"Error analyzing audio: {str(e)}")
             raise
     
+    def analyze_batch(
+        self,
+        audio_paths: List[str],
+        instruments: List[str],
+        apply_noise_reduction: bool = True
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Analyze several recordings (same entry point as RealAudioAnalyzer)
+        
+        Returns the exception in place of the analysis for recordings that failed
+        """
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for path, instrument in zip(audio_paths, instruments):
+            try:
+                results.append(self.analyze(path, instrument=instrument, apply_noise_reduction=apply_noise_reduction))
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def _load_audio(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        """
+        Decode audio as mono float32 at the analysis sample rate
+        
+        libsndfile decodes WAV/FLAC/OGG directly; only recordings at another
+        rate are resampled (soxr). Formats it cannot read (e.g. WebM, M4A)
+        fall back to librosa.load.
+        """
+        try:
+            audio, sr = sf.read(audio_path, dtype='float32', always_2d=False)
+        except Exception:
+            return librosa.load(audio_path, sr=self.sample_rate)
+        
+        if audio.ndim == 2:
+            audio = audio.mean(axis=1)
+        
+        if sr != self.sample_rate:
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=self.sample_rate, res_type='soxr_hq')
+        
+        return audio, self.sample_rate
+    
     def _reduce_noise(self, audio: np.ndarray, sr: int) -> np.ndarray:
         """Apply noise reduction to audio signal"""
+        if self.cuda_available:
+            try:
+                reduced_audio = self._reduce_noise_torch(audio, sr)
+                self.logger.info("Noise reduction applied on GPU")
+                return reduced_audio
+            except Exception as e:
+                self.logger.warning(f"GPU noise reduction failed: {str(e)}, using noisereduce")
+        
         try:
             # Use stationary noise reduction
             # Estimate noise from the first 0.5 seconds (assuming silence or ambient noise)
@@ -83,7 +161,7 @@ class AudioAnalyzer:
                 y=audio,
                 sr=sr,
                 stationary=True,
-                prop_decrease=0.8
+                prop_decrease=NOISE_PROP_DECREASE
             )
             
             self.logger.info("Noise reduction applied successfully")
@@ -93,87 +171,154 @@ class AudioAnalyzer:
             self.logger.warning(f"Error during noise reduction: {str(e)}, using original audio")
             return audio
     
-    def _extract_pitches(self, audio: np.ndarray, sr: int) -> List[Dict]:
-        """Extract pitch information from audio"""
-        # Use pYIN algorithm for pitch tracking
+    def _reduce_noise_torch(self, audio: np.ndarray, sr: int) -> np.ndarray:
+        """
+        Spectral gating on the GPU with torch.stft
+        
+        Args:
+            audio: Audio signal
+            sr: Sample rate
+            
+        Returns:
+            Denoised audio signal of the same length
+        """
+        x = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)).to('cuda')
+        window = torch.hann_window(self.n_fft, device=x.device)
+        
+        spectrum = torch.stft(x, n_fft=self.n_fft, hop_length=self.hop_length,
+                              window=window, return_complex=True)
+        power = spectrum.abs().pow(2)
+        
+        # Noise profile from the first 0.5 seconds (assuming silence or ambient noise)
+        noise_frames = max(1, int(0.5 * sr / self.hop_length))
+        noise_psd = power[:, :noise_frames].mean(dim=1, keepdim=True)
+        
+        # Wiener-style gain, limited to the same reduction as the CPU path
+        gain = (power / (power + noise_psd + 1e-12)).clamp_min(1.0 - NOISE_PROP_DECREASE)
+        
+        reduced = torch.istft(spectrum * gain, n_fft=self.n_fft, hop_length=self.hop_length,
+                              window=window, length=x.shape[0])
+        return reduced.cpu().numpy()
+    
+    def _compute_spectral_features(self, audio: np.ndarray, sr: int) -> Dict[str, np.ndarray]:
+        """
+        Compute the spectrogram once and derive every frame-level feature from it
+        
+        Args:
+            audio: Audio signal
+            sr: Sample rate
+            
+        Returns:
+            Dictionary with the magnitude spectrogram, onset envelopes for onset
+            detection (mean over mel bands) and beat tracking (median, as
+            librosa's beat tracker uses), and the frame times
+        """
+        magnitude = np.abs(librosa.stft(audio, n_fft=self.n_fft, hop_length=self.hop_length))
+        
+        # Same log-mel features onset_strength would compute from the waveform
+        mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr))
+        
+        return {
+            'magnitude': magnitude,
+            'onset_envelope': librosa.onset.onset_strength(S=mel_db, sr=sr),
+            'beat_envelope': librosa.onset.onset_strength(S=mel_db, sr=sr, aggregate=np.median),
+            'times': librosa.frames_to_time(np.arange(magnitude.shape[1]), sr=sr,
+                                            hop_length=self.hop_length)
+        }
+    
+    def _extract_pitches(self, audio: np.ndarray, sr: int, times: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Extract pitch information from audio
+        
+        Returns:
+            Parallel arrays of time, frequency and confidence for each
+            confidently voiced frame, in time order
+        """
+        # Use pYIN algorithm for pitch tracking; its 2048/512 framing matches
+        # the shared STFT, so the frame times are reused
         f0, voiced_flag, voiced_probs = librosa.pyin(
             audio,
             fmin=librosa.note_to_hz('C2'),
             fmax=librosa.note_to_hz('C7'),
-            sr=sr
+            sr=sr,
+            frame_length=self.n_fft,
+            hop_length=self.hop_length
         )
+        times = times[:len(f0)]
         
-        pitches = []
-        hop_length = 512
-        times = librosa.frames_to_time(range(len(f0)), sr=sr, hop_length=hop_length)
-        
-        for i, (time, freq, voiced, prob) in enumerate(zip(times, f0, voiced_flag, voiced_probs)):
-            if voiced and not np.isnan(freq) and prob > 0.5:
-                # Convert frequency to note name
-                note = librosa.hz_to_note(freq)
-                pitches.append({
-                    'time': float(time),
-                    'frequency': float(freq),
-                    'note': note,
-                    'confidence': float(prob)
-                })
-        
-        return pitches
+        # Keep confident voiced frames
+        voiced = voiced_flag & ~np.isnan(f0) & (voiced_probs > 0.5)
+        
+        return {
+            'time': times[voiced],
+            'frequency': f0[voiced],
+            'confidence': voiced_probs[voiced]
+        }
+    
+    def _pitches_to_dicts(self, pitches: Dict[str, np.ndarray]) -> List[Dict]:
+        """Per-frame pitch records for the analysis result"""
+        notes = hz_to_names(pitches['frequency'])
+        
+        return [{
+            'time': time,
+            'frequency': freq,
+            'note': note,
+            'confidence': prob
+        } for time, freq, note, prob in zip(pitches['time'].tolist(), pitches['frequency'].tolist(),
+                                            notes.tolist(), pitches['confidence'].tolist())]
     
-    def _detect_note_onsets(self, audio: np.ndarray, sr: int) -> np.ndarray:
+    def _detect_note_onsets(self, onset_envelope: np.ndarray, sr: int) -> np.ndarray:
         """Detect note onset times"""
         # Detect onsets using spectral flux
         onset_frames = librosa.onset.onset_detect(
-            y=audio,
+            onset_envelope=onset_envelope,
             sr=sr,
+            hop_length=self.hop_length,
             units='frames',
             backtrack=True
         )
         
         # Convert frames to time
-        onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+        onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=self.hop_length)
         
         return onset_times
     
-    def _estimate_tempo(self, audio: np.ndarray, sr: int) -> float:
+    def _estimate_tempo(self, beat_envelope: np.ndarray, sr: int) -> float:
         """Estimate the tempo of the performance"""
-        tempo, _ = librosa.beat.beat_track(y=audio, sr=sr)
+        tempo, _ = librosa.beat.beat_track(onset_envelope=beat_envelope, sr=sr,
+                                           hop_length=self.hop_length)
         return float(tempo)
     
-    def _analyze_dynamics(self, audio: np.ndarray, sr: int) -> List[Dict]:
-        """Analyze dynamic levels (volume) over time"""
-        # Calculate RMS energy
-        rms = librosa.feature.rms(y=audio)[0]
+    def _analyze_dynamics(self, magnitude: np.ndarray, times: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Analyze dynamic levels (volume) over time
+        
+        Returns:
+            Parallel arrays of frame time, RMS level in dB and dynamic level
+        """
+        # Calculate RMS energy from the shared spectrogram
+        rms = librosa.feature.rms(S=magnitude, frame_length=self.n_fft)[0]
         
         # Convert to dB scale
         rms_db = librosa.amplitude_to_db(rms, ref=np.max)
         
-        hop_length = 512
-        times = librosa.frames_to_time(range(len(rms)), sr=sr, hop_length=hop_length)
-        
-        dynamics = []
-        for time, db in zip(times, rms_db):
-            # Classify dynamic level
-            if db > -10:
-                level = 'ff'  # fortissimo
-            elif db > -20:
-                level = 'f'   # forte
-            elif db > -30:
-                level = 'mf'  # mezzo-forte
-            elif db > -40:
-                level = 'mp'  # mezzo-piano
-            elif db > -50:
-                level = 'p'   # piano
-            else:
-                level = 'pp'  # pianissimo
-            
-            dynamics.append({
-                'time': float(time),
-                'db': float(db),
-                'level': level
-            })
+        # Classify dynamic levels: each boundary belongs to the softer level
+        levels = DYNAMIC_LEVELS[np.searchsorted(DYNAMIC_DB_BOUNDARIES, rms_db, side='left')]
         
-        return dynamics
+        return {
+            'time': times[:len(rms_db)],
+            'db': rms_db,
+            'level': levels
+        }
+    
+    def _dynamics_to_dicts(self, dynamics: Dict[str, np.ndarray]) -> List[Dict]:
+        """Per-frame dynamics records for the analysis result"""
+        return [{
+            'time': time,
+            'db': db,
+            'level': level
+        } for time, db, level in zip(dynamics['time'].tolist(), dynamics['db'].tolist(),
+                                     dynamics['level'].tolist())]
     
     def _analyze_rhythm(
         self,
@@ -199,39 +344,30 @@ class AudioAnalyzer:
         self,
         audio: np.ndarray,
         sr: int,
-        pitches: List[Dict],
+        pitches: Dict[str, np.ndarray],
         onsets: np.ndarray,
         instrument: str
     ) -> List[Dict]:
         """Extract individual notes from audio"""
-        notes = []
-        
         if len(onsets) == 0:
-            return notes
+            return []
         
-        # For each onset, find the most common pitch in a window
-        for i, onset_time in enumerate(onsets):
-            # Define window (from onset to next onset or end)
-            window_start = onset_time
-            window_end = onsets[i + 1] if i + 1 < len(onsets) else len(audio) / sr
-            
-            # Find pitches in this window
-            window_pitches = [
-                p for p in pitches
-                if window_start <= p['time'] < window_end
-            ]
-            
-            if window_pitches:
-                # Take the most confident pitch or median pitch
-                window_pitches.sort(key=lambda x: x['confidence'], reverse=True)
-                main_pitch = window_pitches[0]
-                
-                notes.append({
-                    'start_time': float(onset_time),
-                    'duration': float(window_end - window_start),
-                    'pitch': main_pitch['note'],
-                    'frequency': main_pitch['frequency'],
-                    'confidence': main_pitch['confidence']
-                })
-        
-        return notes
+        # Each onset's window runs to the next onset (or the end of the audio);
+        # pitch frames are in time order, so every window is a slice of them
+        window_ends = np.append(onsets[1:], len(audio) / sr)
+        lo = np.searchsorted(pitches['time'], onsets, side='left')
+        hi = np.searchsorted(pitches['time'], window_ends, side='left')
+        
+        # Take the most confident pitch in each non-empty window
+        voiced = np.flatnonzero(hi > lo)
+        best = np.array([lo[i] + np.argmax(pitches['confidence'][lo[i]:hi[i]]) for i in voiced],
+                        dtype=np.intp)
+        names = hz_to_names(pitches['frequency'][best])
+        
+        return [{
+            'start_time': float(onsets[i]),
+            'duration': float(window_ends[i] - onsets[i]),
+            'pitch': name,
+            'frequency': float(pitches['frequency'][k]),
+            'confidence': float(pitches['confidence'][k])
+        } for i, k, name in zip(voiced, best, names.tolist())]
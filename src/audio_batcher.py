@@ -0,0 +1,95 @@
+"""
+Audio Batcher - Groups concurrent performance analyses into batched calls
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Flush a batch once it holds this many recordings...
+BATCH_MAX = int(os.environ.get('AUDIO_BATCH_MAX', 8))
+# ...or once the oldest request has waited this long
+BATCH_MS = int(os.environ.get('AUDIO_BATCH_MS', 20))
+
+
+class AudioBatcher:
+    """
+    Micro-batching coordinator in front of an analyzer's analyze_batch
+
+    Requests arriving within BATCH_MS of each other share one pitch-tracking
+    pass instead of each paying the per-call setup cost.
+    """
+
+    def __init__(self, analyzer, batch_max: int = BATCH_MAX, batch_ms: int = BATCH_MS):
+        """
+        Initialize the batcher
+
+        Args:
+            analyzer: Audio analyzer or AnalysisPool exposing analyze_batch()
+            batch_max: Maximum recordings per batch
+            batch_ms: Maximum time to wait for a batch to fill, in milliseconds
+        """
+        self.logger = logger
+        self.analyzer = analyzer
+        self.batch_max = batch_max
+        self.batch_wait = batch_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[str, str, Future]]" = queue.Queue()
+
+        self._worker = threading.Thread(target=self._loop, name='mugic-audio-batcher', daemon=True)
+        self._worker.start()
+
+    def analyze(self, audio_path: str, instrument: str = 'piano') -> Dict[str, Any]:
+        """
+        Analyze a recording, sharing the inference call with concurrent requests
+
+        Args:
+            audio_path: Path to audio file
+            instrument: Instrument type
+
+        Returns:
+            Audio analysis for this recording
+        """
+        future: Future = Future()
+        self._queue.put((audio_path, instrument, future))
+        return future.result()
+
+    def _loop(self):
+        """Collect queued requests into batches and run them"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+
+            # Keep collecting until the batch is full or the window closes
+            try:
+                while len(batch) < self.batch_max:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[str, str, Future]]):
+        """Run one batched analysis and hand each result back to its caller"""
+        paths = [item[0] for item in batch]
+        instruments = [item[1] for item in batch]
+
+        try:
+            results = self.analyzer.analyze_batch(paths, instruments, apply_noise_reduction=True)
+            # A failed recording comes back as its exception and only fails its own caller
+            for (_, _, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            self.logger.error(f"Batched audio analysis failed: {str(e)}")
+            for _, _, future in batch:
+                future.set_exception(e)
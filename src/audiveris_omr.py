@@ -4,17 +4,41 @@ Uses the Audiveris open-source OMR system from GitHub
 https://github.com/Audiveris/audiveris
 """
 import os
+import signal
 import subprocess
 import logging
 import shutil
 import tempfile
+import weakref
+import threading
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 import xml.etree.ElementTree as ET
-from music21 import converter, stream
+
+from src.musicxml_parser import parse_score, note_dicts
 
 logger = logging.getLogger(__name__)
 
+# JVM startup dominates small scores. Audiveris has no server mode, so instead
+# of a long-lived process we cut the per-run boot cost with an application
+# class-data-sharing archive (created on first run, reused afterwards).
+# IgnoreUnrecognizedVMOptions keeps older JREs (< 19) working without it.
+JVM_OPTIONS = [
+    '-XX:+IgnoreUnrecognizedVMOptions',
+    '-XX:+AutoCreateSharedArchive',
+    f"-XX:SharedArchiveFile={os.path.join(tempfile.gettempdir(), 'mugic_audiveris.jsa')}",
+    '-Xshare:auto',
+]
+
+# MusicXML files Audiveris may export, in order of preference
+MUSICXML_EXTENSIONS = ('.mxl', '.xml', '.musicxml')
+MUSICXML_EXTENSION_RANK = {ext: rank for rank, ext in enumerate(MUSICXML_EXTENSIONS)}
+
+# Seconds each score in a batch may take before the JVM is killed. Large PDFs
+# get more time: one second per AUDIVERIS_BYTES_PER_SECOND bytes if that is longer.
+AUDIVERIS_TIMEOUT_PER_SCORE = 300
+AUDIVERIS_BYTES_PER_SECOND = 50_000
+
 
 class AudiverisOMR:
     """
@@ -33,9 +57,19 @@ class AudiverisOMR:
         self.logger = logger
         self.audiveris_path = audiveris_path or self._find_audiveris()
         self.temp_dir = tempfile.mkdtemp(prefix='mugic_audiveris_')
+        # Removes the directory at garbage collection or interpreter exit,
+        # even if cleanup() is never called
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.temp_dir, ignore_errors=True)
+        
+        # Launcher that last ran successfully; tried first on later runs
+        self._working_launcher: Optional[List[str]] = None
+        
+        # One Audiveris JVM per worker at a time; concurrent JVMs just fight
+        # over memory and CPU
+        self._lock = threading.Lock()
         
         if self.audiveris_path:
-            self.logger.info(f"Audiveris found at: {self.audiveris_path}")
+            self.logger.info("Audiveris found at: %s", self.audiveris_path)
         else:
             self.logger.warning("Audiveris not found. Using fallback OMR.")
     
@@ -86,10 +120,11 @@ class AudiverisOMR:
                     "https://github.com/Audiveris/audiveris/releases"
                 )
             
-            self.logger.info(f"Processing {pdf_path} with Audiveris")
+            self.logger.info("Processing %s with Audiveris", pdf_path)
             
             # Run Audiveris to transcribe PDF to MusicXML
-            musicxml_path = self._run_audiveris(pdf_path)
+            with self._lock:
+                musicxml_path = self._run_audiveris(pdf_path)
             
             if not musicxml_path or not os.path.exists(musicxml_path):
                 raise RuntimeError("Audiveris failed to generate MusicXML output")
@@ -97,16 +132,16 @@ class AudiverisOMR:
             # Parse MusicXML to extract musical information
             analysis = self._parse_musicxml(musicxml_path)
             
-            self.logger.info(f"Audiveris analysis complete: {len(analysis['notes'])} notes")
+            self.logger.info("Audiveris analysis complete: %s notes", len(analysis['notes']))
             return analysis
             
         except Exception as e:
-            self.logger.error(f"Audiveris analysis failed: {str(e)}")
+            self.logger.error("Audiveris analysis failed: %s", e)
             raise
     
     def _run_audiveris(self, input_pdf: str) -> Optional[str]:
         """
-        Run Audiveris command-line tool
+        Run Audiveris command-line tool on a single PDF
         
         Args:
             input_pdf: Path to input PDF
@@ -114,92 +149,146 @@ class AudiverisOMR:
         Returns:
             Path to generated MusicXML file
         """
+        return self._run_audiveris_batch([input_pdf]).get(input_pdf)
+    
+    def _run_audiveris_batch(self, input_pdfs: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Run Audiveris command-line tool once for several PDFs
+        
+        Args:
+            input_pdfs: Paths to input PDFs (distinct file names)
+            
+        Returns:
+            Path to the generated MusicXML file for each input PDF (None if missing)
+        """
         try:
             # Output file path
             output_dir = self.temp_dir
-            basename = os.path.splitext(os.path.basename(input_pdf))[0]
-            output_mxl = os.path.join(output_dir, f"{basename}.mxl")
             
             # Audiveris command (adjust based on installation)
             # The -batch flag runs in batch mode without GUI
             # -export saves to MusicXML format
+            arguments = ['-batch', '-export', '-output', output_dir, *input_pdfs]
             
-            # Try different command formats
-            commands = [
+            # Try different command formats, starting with the one that worked last time
+            launchers = [
                 # Standard Audiveris CLI
-                [
-                    'java', '-jar', 
-                    os.path.join(self.audiveris_path, 'audiveris.jar'),
-                    '-batch',
-                    '-export',
-                    '-output', output_dir,
-                    input_pdf
-                ],
+                ['java', *JVM_OPTIONS, '-jar', os.path.join(self.audiveris_path, 'audiveris.jar')],
                 # Alternative: using audiveris script
-                [
-                    os.path.join(self.audiveris_path, 'bin', 'audiveris'),
-                    '-batch',
-                    '-export',
-                    '-output', output_dir,
-                    input_pdf
-                ],
+                [os.path.join(self.audiveris_path, 'bin', 'audiveris')],
                 # Alternative: direct executable
-                [
-                    'audiveris',
-                    '-batch',
-                    '-export',
-                    '-output', output_dir,
-                    input_pdf
-                ]
+                ['audiveris']
             ]
+            if self._working_launcher in launchers:
+                launchers.remove(self._working_launcher)
+                launchers.insert(0, self._working_launcher)
+            
+            # The launcher scripts pass JAVA_OPTS through to the JVM
+            env = dict(os.environ)
+            env['JAVA_OPTS'] = ' '.join(filter(None, [env.get('JAVA_OPTS'), *JVM_OPTIONS]))
+            
+            timeout = sum(
+                max(AUDIVERIS_TIMEOUT_PER_SCORE, os.path.getsize(pdf) / AUDIVERIS_BYTES_PER_SECOND)
+                for pdf in input_pdfs
+            )
             
             success = False
-            for cmd in commands:
+            for launcher in launchers:
+                cmd = launcher + arguments
                 try:
-                    self.logger.info(f"Trying command: {' '.join(cmd)}")
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=300  # 5 minute timeout
-                    )
+                    self.logger.info("Trying command: %s", cmd)
+                    returncode, stderr = self._run_command(cmd, env, timeout)
                     
-                    if result.returncode == 0:
+                    if returncode == 0:
                         self.logger.info("Audiveris completed successfully")
+                        self._working_launcher = launcher
                         success = True
                         break
                     else:
-                        self.logger.warning(f"Command failed: {result.stderr}")
+                        self.logger.warning("Command failed: %s", stderr)
                         
                 except FileNotFoundError:
                     continue
+                except subprocess.TimeoutExpired:
+                    # Another launcher would hit the same limit; give up on this batch
+                    raise
                 except Exception as e:
-                    self.logger.warning(f"Command error: {e}")
+                    self.logger.warning("Command error: %s", e)
                     continue
             
             if not success:
                 raise RuntimeError("All Audiveris command attempts failed")
             
-            # Find the generated MusicXML file
+            # Find the generated MusicXML files in one directory scan
             # Audiveris may generate .mxl or .xml files
-            for ext in ['.mxl', '.xml', '.musicxml']:
-                potential_path = os.path.join(output_dir, basename + ext)
-                if os.path.exists(potential_path):
-                    return potential_path
+            exported: Dict[str, tuple] = {}
+            any_export = None
+            with os.scandir(output_dir) as entries:
+                for entry in entries:
+                    stem, ext = os.path.splitext(entry.name)
+                    rank = MUSICXML_EXTENSION_RANK.get(ext)
+                    if rank is None or not entry.is_file():
+                        continue
+                    
+                    any_export = any_export or entry.path
+                    current = exported.get(stem)
+                    if current is None or rank < current[0]:
+                        exported[stem] = (rank, entry.path)
             
-            # Search output directory
-            for file in os.listdir(output_dir):
-                if file.endswith(('.mxl', '.xml', '.musicxml')):
-                    return os.path.join(output_dir, file)
+            outputs = {
+                pdf: exported[Path(pdf).stem][1] if Path(pdf).stem in exported else None
+                for pdf in input_pdfs
+            }
             
-            return None
+            # A single score may be exported under another name (e.g. per movement)
+            if len(input_pdfs) == 1 and outputs[input_pdfs[0]] is None:
+                outputs[input_pdfs[0]] = any_export
+            
+            return outputs
             
         except subprocess.TimeoutExpired:
             self.logger.error("Audiveris timeout")
-            return None
+            return {}
         except Exception as e:
-            self.logger.error(f"Error running Audiveris: {e}")
-            return None
+            self.logger.error("Error running Audiveris: %s", e)
+            return {}
+    
+    def _run_command(self, cmd: List[str], env: Dict[str, str], timeout: float) -> tuple:
+        """
+        Run an Audiveris command in its own process group
+        
+        The launcher scripts start the JVM as a child process, so on timeout
+        the whole group is killed rather than just the direct child.
+        
+        Args:
+            cmd: Command line
+            env: Environment variables
+            timeout: Seconds before the process group is killed
+            
+        Returns:
+            Tuple of (return code, stderr)
+        """
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+            start_new_session=True
+        )
+        
+        try:
+            _, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.error("Audiveris exceeded %.0fs; killing process group %s", timeout, proc.pid)
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            proc.communicate()
+            raise
+        
+        return proc.returncode, stderr
     
     def _parse_musicxml(self, musicxml_path: str) -> Dict[str, Any]:
         """
@@ -212,90 +301,44 @@ class AudiverisOMR:
             Analysis dictionary with notes, rhythms, metadata
         """
         try:
-            # Use music21 to parse MusicXML
-            score = converter.parse(musicxml_path)
-            
-            # Extract notes
-            notes_list = []
-            rhythms_list = []
-            
-            # Get all notes from all parts
-            for part in score.parts:
-                current_time = 0.0
-                
-                for element in part.flatten().notesAndRests:
-                    if hasattr(element, 'pitch') and element.pitch:
-                        # It's a note
-                        notes_list.append({
-                            'pitch': element.pitch.nameWithOctave,
-                            'midi_note': element.pitch.midi,
-                            'start_time': float(element.offset),
-                            'duration': float(element.duration.quarterLength),
-                            'velocity': 80
-                        })
-                        
-                        rhythms_list.append({
-                            'type': element.duration.type,
-                            'duration': float(element.duration.quarterLength),
-                            'start_time': float(element.offset)
-                        })
-            
-            # Extract metadata
-            time_signature = '4/4'
-            key_signature = 'C'
-            tempo_marking = 120
-            
-            # Get time signature
-            ts = score.flatten().getElementsByClass('TimeSignature')
-            if ts:
-                time_signature = ts[0].ratioString
-            
-            # Get key signature
-            ks = score.flatten().getElementsByClass('KeySignature')
-            if ks:
-                key_signature = ks[0].asKey().tonic.name
-            
-            # Get tempo
-            tempo_marks = score.flatten().getElementsByClass('MetronomeMark')
-            if tempo_marks:
-                tempo_marking = int(tempo_marks[0].number)
-            
-            # Count measures
-            measures = len(score.parts[0].getElementsByClass('Measure')) if score.parts else 0
+            parsed = parse_score(musicxml_path)
+            notes, rhythms = note_dicts(parsed['note_array'])
             
-            analysis = {
-                'notes': notes_list,
-                'rhythms': rhythms_list,
-                'time_signature': time_signature,
-                'key_signature': key_signature,
-                'tempo': tempo_marking,
+            return {
+                'notes': notes,
+                'rhythms': rhythms,
+                'time_signature': parsed['time_signature'],
+                'key_signature': parsed['key_signature'],
+                'tempo': parsed['tempo'],
                 'clef': 'treble',  # Default
                 'num_pages': 1,
-                'num_staves': len(score.parts),
-                'total_measures': measures,
+                'num_staves': parsed['num_parts'],
+                'total_measures': parsed['total_measures'],
                 'analysis_method': 'Audiveris OMR',
                 'has_real_detection': True,
                 'musicxml_path': musicxml_path
             }
-            
-            return analysis
-            
         except Exception as e:
-            self.logger.error(f"Error parsing MusicXML: {e}")
+            self.logger.error("Error parsing MusicXML: %s", e)
             raise
     
     def cleanup(self):
         """Clean up temporary files"""
         try:
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
+            if self._finalizer.alive:
+                self._finalizer()
                 self.logger.info("Cleaned up temporary files")
         except Exception as e:
-            self.logger.warning(f"Failed to cleanup temp directory: {e}")
+            self.logger.warning("Failed to cleanup temp directory: %s", e)
     
-    def __del__(self):
-        """Cleanup on deletion"""
+    def __enter__(self):
+        """Use the engine as a context manager that cleans up on exit"""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Remove the temporary directory"""
         self.cleanup()
+        return False
 
 
 def download_audiveris(install_path: str = './audiveris') -> bool:
@@ -308,7 +351,7 @@ def download_audiveris(install_path: str = './audiveris') -> bool:
     Returns:
         True if successful
     """
-    logger.info(f"Downloading Audiveris to {install_path}")
+    logger.info("Downloading Audiveris to %s", install_path)
     
     try:
         # Audiveris GitHub release URL
@@ -324,14 +367,14 @@ def download_audiveris(install_path: str = './audiveris') -> bool:
         elif system == 'windows':
             download_url = f"https://github.com/Audiveris/audiveris/releases/download/{audiveris_version}/Audiveris-{audiveris_version}.exe"
         else:
-            logger.error(f"Unsupported platform: {system}")
+            logger.error("Unsupported platform: %s", system)
             return False
         
-        logger.info(f"Please download Audiveris from: {download_url}")
+        logger.info("Please download Audiveris from: %s", download_url)
         logger.info("Or visit: https://github.com/Audiveris/audiveris/releases")
         
         return False  # Manual download required
         
     except Exception as e:
-        logger.error(f"Error setting up Audiveris: {e}")
+        logger.error("Error setting up Audiveris: %s", e)
         return False
@@ -2,8 +2,16 @@
 User authentication system with sign-in/sign-up functionality
 """
 import os
+import hashlib
+import hmac
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import wraps, lru_cache
+from typing import Optional
 from flask import request, jsonify, session
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import (
@@ -13,13 +21,165 @@ from flask_jwt_extended import (
     get_jwt_identity,
     jwt_required
 )
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, or_
+from sqlalchemy.exc import IntegrityError
 from src.database import Base, db_session
 import re
 
 bcrypt = Bcrypt()
 jwt = JWTManager()
 
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+USERNAME_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+# bcrypt work factor (2^rounds key setups). 12 is the production default;
+# lower it (e.g. BCRYPT_COST=10, 4x faster) only for development and tests,
+# since every step down halves the cost of an offline guessing attack.
+# Stored hashes with a lower cost are rehashed on the next login (never
+# downward), and costs below BCRYPT_MIN_LOG_ROUNDS are refused outright.
+BCRYPT_MIN_LOG_ROUNDS = 10
+BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_COST', 12))
+if BCRYPT_LOG_ROUNDS < BCRYPT_MIN_LOG_ROUNDS:
+    raise ValueError(f"BCRYPT_COST must be at least {BCRYPT_MIN_LOG_ROUNDS}, got {BCRYPT_LOG_ROUNDS}")
+
+# bcrypt is deliberately slow; hashing in worker processes keeps it off the
+# web worker (and its GIL). Set BCRYPT_PROCESSES=0 to hash in-process.
+BCRYPT_PROCESSES = int(os.environ.get('BCRYPT_PROCESSES', min(4, os.cpu_count() or 1)))
+
+_bcrypt_pool = None
+_bcrypt_pool_lock = threading.Lock()
+
+# Recent verification results, so clients that re-send credentials within the
+# TTL skip the bcrypt rounds. Keys hold an HMAC of the password, never the
+# password itself. Set BCRYPT_VERIFY_CACHE_TTL=0 to disable.
+VERIFY_CACHE_TTL = float(os.environ.get('BCRYPT_VERIFY_CACHE_TTL', 60))
+VERIFY_CACHE_SIZE = 1024
+_VERIFY_PEPPER = os.environ.get('PEPPER', '').encode('utf-8') or os.urandom(32)
+
+_verify_cache: 'OrderedDict[tuple, tuple]' = OrderedDict()
+_verify_cache_lock = threading.Lock()
+
+ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+
+# Logins within this many seconds of the last one for the same user get the
+# same tokens back (they keep at least ACCESS_TOKEN_EXPIRES minus this much
+# lifetime). Set JWT_REUSE_SECONDS=0 to sign fresh tokens on every login.
+JWT_REUSE_SECONDS = float(os.environ.get('JWT_REUSE_SECONDS', 300))
+TOKEN_CACHE_SIZE = 10000
+
+_token_cache: 'OrderedDict[int, tuple]' = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
+def _get_bcrypt_pool():
+    """Start the bcrypt process pool on first use (None when disabled)"""
+    global _bcrypt_pool
+    
+    if BCRYPT_PROCESSES <= 0:
+        return None
+    
+    with _bcrypt_pool_lock:
+        if _bcrypt_pool is None:
+            # spawn keeps gevent's monkey-patching and open DB connections out of the workers
+            _bcrypt_pool = ProcessPoolExecutor(
+                max_workers=BCRYPT_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _bcrypt_pool
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt in a worker process"""
+    pool = _get_bcrypt_pool()
+    if pool is None:
+        password_hash = bcrypt.generate_password_hash(password)
+    else:
+        password_hash = pool.submit(bcrypt.generate_password_hash, password).result()
+    return password_hash.decode('utf-8')
+
+
+def _check_password_uncached(password_hash: str, password: str) -> bool:
+    """Verify a password against a bcrypt hash in a worker process"""
+    pool = _get_bcrypt_pool()
+    if pool is None:
+        return bcrypt.check_password_hash(password_hash, password)
+    return pool.submit(bcrypt.check_password_hash, password_hash, password).result()
+
+
+def check_password(password_hash: str, password: str) -> bool:
+    """
+    Verify a password against a bcrypt hash, reusing results from the last
+    VERIFY_CACHE_TTL seconds
+    """
+    if VERIFY_CACHE_TTL <= 0:
+        return _check_password_uncached(password_hash, password)
+    
+    key = (password_hash, hmac.new(_VERIFY_PEPPER, password.encode('utf-8'), hashlib.sha256).digest())
+    now = time.monotonic()
+    
+    with _verify_cache_lock:
+        cached = _verify_cache.get(key)
+        if cached is not None and now - cached[0] < VERIFY_CACHE_TTL:
+            return cached[1]
+    
+    result = _check_password_uncached(password_hash, password)
+    
+    with _verify_cache_lock:
+        _verify_cache[key] = (now, result)
+        _verify_cache.move_to_end(key)
+        while len(_verify_cache) > VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    
+    return result
+
+
+def issue_tokens(user_id: int) -> dict:
+    """
+    Access and refresh tokens for a user
+    
+    Tokens signed in the last JWT_REUSE_SECONDS are handed out again, so a
+    client logging in repeatedly does not pay for signing on every request.
+    """
+    now = time.monotonic()
+    
+    if JWT_REUSE_SECONDS > 0:
+        with _token_cache_lock:
+            cached = _token_cache.get(user_id)
+            if cached is not None and now - cached[0] < JWT_REUSE_SECONDS:
+                return dict(cached[1])
+    
+    tokens = {
+        'access_token': create_access_token(identity=user_id, expires_delta=ACCESS_TOKEN_EXPIRES),
+        'refresh_token': create_refresh_token(identity=user_id, expires_delta=REFRESH_TOKEN_EXPIRES)
+    }
+    
+    if JWT_REUSE_SECONDS > 0:
+        with _token_cache_lock:
+            _token_cache[user_id] = (now, tokens)
+            _token_cache.move_to_end(user_id)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    
+    return dict(tokens)
+
+
+def _hash_cost(password_hash: str) -> Optional[int]:
+    """Work factor of a bcrypt hash ('$2b$12$...' -> 12), None if unrecognized"""
+    parts = password_hash.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+@lru_cache(maxsize=1)
+def _dummy_password_hash() -> str:
+    """
+    Hash checked when a login names no user, so unknown and known accounts
+    take the same time (created lazily, after init_app sets the cost factor)
+    """
+    return hash_password(os.urandom(16).hex())
+
 
 class User(Base):
     """User model for authentication"""
@@ -55,8 +215,7 @@ class AuthManager:
     @staticmethod
     def validate_email(email: str) -> bool:
         """Validate email format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return EMAIL_RE.match(email) is not None
     
     @staticmethod
     def validate_password(password: str) -> tuple[bool, str]:
@@ -67,13 +226,23 @@ class AuthManager:
         if len(password) < 8:
             return False, "Password must be at least 8 characters long"
         
-        if not re.search(r'[A-Z]', password):
+        # One pass over the password instead of a regex scan per character class
+        has_upper = has_lower = has_digit = False
+        for c in password:
+            if 'A' <= c <= 'Z':
+                has_upper = True
+            elif 'a' <= c <= 'z':
+                has_lower = True
+            elif c.isdecimal():
+                has_digit = True
+        
+        if not has_upper:
             return False, "Password must contain at least one uppercase letter"
         
-        if not re.search(r'[a-z]', password):
+        if not has_lower:
             return False, "Password must contain at least one lowercase letter"
         
-        if not re.search(r'\d', password):
+        if not has_digit:
             return False, "Password must contain at least one number"
         
         return True, ""
@@ -90,7 +259,7 @@ class AuthManager:
         if len(username) > 80:
             return False, "Username must be less than 80 characters"
         
-        if not re.match(r'^[a-zA-Z0-9_-]+$', username):
+        if not USERNAME_RE.match(username):
             return False, "Username can only contain letters, numbers, underscores, and hyphens"
         
         return True, ""
@@ -116,18 +285,13 @@ class AuthManager:
             if not valid:
                 return False, error, None
             
-            # Check if username already exists
-            existing_user = db_session.query(User).filter_by(username=username).first()
-            if existing_user:
-                return False, "Username already taken", None
-            
-            # Check if email already exists
-            existing_email = db_session.query(User).filter_by(email=email).first()
-            if existing_email:
-                return False, "Email already registered", None
+            # Check username and email in one query (before the costly bcrypt hash)
+            conflict = AuthManager._registration_conflict(username, email)
+            if conflict:
+                return False, conflict, None
             
             # Hash password
-            password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+            password_hash = hash_password(password)
             
             # Create user
             new_user = User(
@@ -139,7 +303,13 @@ class AuthManager:
             )
             
             db_session.add(new_user)
-            db_session.commit()
+            try:
+                db_session.commit()
+            except IntegrityError:
+                # Lost a race with a concurrent sign-up for the same name or email
+                db_session.rollback()
+                conflict = AuthManager._registration_conflict(username, email)
+                return False, conflict or "Username or email already registered", None
             
             return True, "User registered successfully", new_user.to_dict()
             
@@ -147,6 +317,26 @@ class AuthManager:
             db_session.rollback()
             return False, f"Registration failed: {str(e)}", None
     
+    @staticmethod
+    def _registration_conflict(username: str, email: str) -> Optional[str]:
+        """
+        Check whether a username or email is already registered
+        Returns: error message, or None if both are free
+        """
+        # Unique columns: at most one row per match, so two rows at most
+        existing = db_session.query(User.username, User.email).filter(
+            or_(User.username == username, User.email == email)
+        ).limit(2).all()
+        
+        if not existing:
+            return None
+        
+        # Report a taken username first, whichever row the database returned first
+        if any(row.username == username for row in existing):
+            return "Username already taken"
+        
+        return "Email already registered"
+    
     @staticmethod
     def authenticate_user(username_or_email: str, password: str) -> tuple[bool, str, dict, dict]:
         """
@@ -159,6 +349,11 @@ class AuthManager:
                 (User.username == username_or_email) | (User.email == username_or_email)
             ).first()
             
+            # Always run a bcrypt check so a missing user is not faster to reject
+            password_ok = check_password(
+                user.password_hash if user else _dummy_password_hash(), password
+            )
+            
             if not user:
                 return False, "Invalid credentials", None, None
             
@@ -167,27 +362,21 @@ class AuthManager:
                 return False, "Account is inactive", None, None
             
             # Verify password
-            if not bcrypt.check_password_hash(user.password_hash, password):
+            if not password_ok:
                 return False, "Invalid credentials", None, None
             
+            # Bring hashes made under a weaker work factor up to date while
+            # the plaintext is at hand; stronger ones are left alone
+            cost = _hash_cost(user.password_hash)
+            if cost is None or cost < BCRYPT_LOG_ROUNDS:
+                user.password_hash = hash_password(password)
+            
             # Update last login
             user.last_login = datetime.utcnow()
             db_session.commit()
             
             # Generate tokens
-            access_token = create_access_token(
-                identity=user.id,
-                expires_delta=timedelta(hours=1)
-            )
-            refresh_token = create_refresh_token(
-                identity=user.id,
-                expires_delta=timedelta(days=30)
-            )
-            
-            tokens = {
-                'access_token': access_token,
-                'refresh_token': refresh_token
-            }
+            tokens = issue_tokens(user.id)
             
             return True, "Login successful", user.to_dict(), tokens
             
@@ -248,7 +437,7 @@ class AuthManager:
                 return False, "User not found"
             
             # Verify old password
-            if not bcrypt.check_password_hash(user.password_hash, old_password):
+            if not check_password(user.password_hash, old_password):
                 return False, "Current password is incorrect"
             
             # Validate new password
@@ -257,7 +446,7 @@ class AuthManager:
                 return False, error
             
             # Hash and update password
-            user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+            user.password_hash = hash_password(new_password)
             db_session.commit()
             
             return True, "Password changed successfully"
@@ -271,8 +460,10 @@ def init_auth(app):
     """Initialize authentication system with Flask app"""
     # Configure JWT
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key-change-in-production')
-    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = ACCESS_TOKEN_EXPIRES
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = REFRESH_TOKEN_EXPIRES
+    
+    app.config['BCRYPT_LOG_ROUNDS'] = BCRYPT_LOG_ROUNDS
     
     # Initialize extensions
     bcrypt.init_app(app)
@@ -0,0 +1,88 @@
+"""
+Analysis components - Lazily built OMR, audio and feedback engines
+Shared by the web app and the analysis worker processes
+"""
+import os
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MUGIC_BACKEND selects the implementation: 'real' (Audiveris/OEMER OMR,
+# librosa transcription, LLM feedback) or 'stub' (lightweight analyzers with
+# no Java/ML dependencies, for local development and tests).
+MUGIC_BACKEND = os.environ.get('MUGIC_BACKEND', 'real').lower()
+
+
+@functools.cache
+def get_omr_system():
+    """Get the best available OMR system (Audiveris > OEMER > Computer Vision OMR)"""
+    if MUGIC_BACKEND == 'stub':
+        from src.sheet_music_analyzer import SheetMusicAnalyzer
+        logger.info("Using stub sheet music analyzer (MUGIC_BACKEND=stub)")
+        return SheetMusicAnalyzer()
+    
+    try:
+        # Try Audiveris first (best quality OMR, but requires Java)
+        from src.audiveris_omr import AudiverisOMR
+        audiveris_omr = AudiverisOMR()
+        if audiveris_omr.is_available():
+            logger.info("✓ Using Audiveris OMR (GitHub open-source)")
+            logger.info("  Best quality - requires Java runtime")
+            return audiveris_omr
+    except Exception as e:
+        logger.warning(f"Audiveris initialization error: {e}")
+    
+    # Try OEMER as second choice (great for serverless like Vercel)
+    try:
+        from src.oemer_omr import OemerOMR
+        oemer_omr = OemerOMR()
+        if oemer_omr.is_available():
+            logger.info("✓ Using OEMER OMR by BreezeWhite")
+            logger.info("  Excellent quality - serverless-friendly")
+            return oemer_omr
+        logger.info("⚠ OEMER not found, trying fallback")
+        logger.info("  Install OEMER with: pip install oemer")
+    except Exception as e:
+        logger.warning(f"OEMER initialization error: {e}")
+    
+    # Final fallback to computer vision-based OMR
+    try:
+        from src.real_omr_system import RealOMRSystem
+        omr_system = RealOMRSystem()
+        logger.info("⚠ Using computer vision OMR fallback")
+        logger.info("  Good quality - always available")
+        return omr_system
+    except Exception as e:
+        logger.error(f"All OMR systems failed: {e}")
+        raise RuntimeError("No OMR system available")
+
+
+@functools.cache
+def get_audio_analyzer():
+    """Get the real audio analyzer"""
+    if MUGIC_BACKEND == 'stub':
+        from src.audio_analyzer import AudioAnalyzer
+        logger.info("Using stub audio analyzer (MUGIC_BACKEND=stub)")
+        return AudioAnalyzer()
+    
+    try:
+        from src.real_audio_analyzer import RealAudioAnalyzer
+        audio_analyzer = RealAudioAnalyzer()
+        logger.info("✓ Using Spotify basic-pitch for audio transcription")
+        return audio_analyzer
+    except Exception as e:
+        logger.error(f"Audio analyzer initialization error: {e}")
+        raise RuntimeError("basic-pitch is required. Install with: pip install basic-pitch")
+
+
+@functools.cache
+def get_feedback_generator():
+    """Get the real feedback generator with LLM"""
+    if MUGIC_BACKEND == 'stub':
+        from src.feedback_generator import FeedbackGenerator
+        logger.info("Using stub feedback generator (MUGIC_BACKEND=stub)")
+        return FeedbackGenerator()
+    
+    from src.real_feedback_generator import RealFeedbackGenerator
+    return RealFeedbackGenerator()
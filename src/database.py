@@ -2,7 +2,9 @@
 Database models and initialization
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, ForeignKey
+import json
+import msgpack
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Text, LargeBinary, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker, relationship
 
@@ -15,7 +17,7 @@ class Piece(Base):
     
     id = Column(Integer, primary_key=True)
     filename = Column(String(255), nullable=False)
-    analysis = Column(Text, nullable=False)  # JSON string
+    analysis = Column(LargeBinary, nullable=False)  # MessagePack blob
     upload_date = Column(DateTime, nullable=False)
     
     # Relationship to practice sessions
@@ -28,8 +30,8 @@ class PracticeSession(Base):
     
     id = Column(Integer, primary_key=True)
     piece_id = Column(Integer, ForeignKey('pieces.id'), nullable=False)
-    audio_analysis = Column(Text, nullable=False)  # JSON string
-    feedback = Column(Text, nullable=False)  # JSON string
+    audio_analysis = Column(LargeBinary, nullable=False)  # MessagePack blob
+    feedback = Column(LargeBinary, nullable=False)  # MessagePack blob
     instrument = Column(String(100), nullable=False)
     score = Column(Integer, nullable=False)
     session_date = Column(DateTime, nullable=False)
@@ -38,9 +40,51 @@ class PracticeSession(Base):
     piece = relationship('Piece', back_populates='sessions')
 
 
+class OMRCacheEntry(Base):
+    """Cached OMR analysis keyed by sheet music content hash"""
+    __tablename__ = 'omr_cache'
+    
+    digest = Column(String(64), primary_key=True)  # BLAKE3 (or BLAKE2b) hex digest of the PDF
+    analysis = Column(LargeBinary, nullable=False)  # MessagePack blob
+    created_at = Column(DateTime, nullable=False)
+
+
+class AnalysisJob(Base):
+    """Background analysis job model"""
+    __tablename__ = 'analysis_jobs'
+    
+    id = Column(String(36), primary_key=True)  # UUID4 hex string
+    status = Column(String(20), nullable=False)  # queued, running, completed, failed
+    result = Column(Text)  # JSON string
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
 # Database setup
 db_path = os.path.join(os.path.dirname(__file__), '..', 'mugic.db')
-engine = create_engine(f'sqlite:///{db_path}', echo=False)
+# Pooled connections are reused across requests, so the PRAGMAs below run
+# once per connection rather than once per query
+engine = create_engine(
+    f'sqlite:///{db_path}',
+    echo=False,
+    pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+    max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+    connect_args={'check_same_thread': False}
+)
+
+
+@event.listens_for(engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection for concurrent readers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')  # Readers no longer block on the writer
+    cursor.execute('PRAGMA synchronous=NORMAL')  # Safe with WAL, far fewer fsyncs
+    cursor.execute('PRAGMA mmap_size=268435456')  # Serve reads from a 256MB memory map
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
 db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
 Base.query = db_session.query_property()
@@ -49,3 +93,22 @@ Base.query = db_session.query_property()
 def init_db():
     """Initialize the database"""
     Base.metadata.create_all(bind=engine)
+
+
+def _pack_default(obj):
+    """Convert numpy arrays/scalars for MessagePack"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize object of type {type(obj).__name__}")
+
+
+def pack_blob(obj) -> bytes:
+    """Serialize an analysis payload as a MessagePack blob"""
+    return msgpack.packb(obj, use_bin_type=True, default=_pack_default)
+
+
+def unpack_blob(value):
+    """Deserialize a stored payload (MessagePack, or JSON text from older rows)"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return msgpack.unpackb(value, raw=False)
@@ -7,6 +7,8 @@ import librosa
 import noisereduce as nr
 from typing import Dict, List, Any, Optional
 
+from src.numba_compat import njit
+
 try:
     import crepe
     CREPE_AVAILABLE = True
@@ -15,6 +17,59 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Upper dB bound (inclusive, relative to the loudest frame) of each dynamic
+# level; anything louder than the last boundary is 'fff'
+DYNAMIC_DB_BOUNDARIES = np.array([-50, -40, -32, -25, -18, -12, -5])
+DYNAMIC_LEVELS = np.array([
+    'ppp',  # pianississimo
+    'pp',   # pianissimo
+    'p',    # piano
+    'mp',   # mezzo-piano
+    'mf',   # mezzo-forte
+    'f',    # forte
+    'ff',   # fortissimo
+    'fff'   # fortississimo
+])
+
+
+@njit(cache=True)
+def segment_notes(onsets, end_time, pitch_times, pitch_freqs, pitch_confs):
+    """
+    Summarize the pitch frames between consecutive onsets
+    
+    Args:
+        onsets: Onset times in seconds (ascending)
+        end_time: End of the last window (audio duration)
+        pitch_times: Times of the pitch frames (ascending)
+        pitch_freqs: Frequency of each pitch frame
+        pitch_confs: Confidence of each pitch frame
+        
+    Returns:
+        Tuple of (window ends, median frequency, mean confidence, frame count)
+        per onset; windows without pitch frames have a count of 0
+    """
+    n = len(onsets)
+    window_ends = np.empty(n)
+    window_ends[:n - 1] = onsets[1:]
+    window_ends[n - 1] = end_time
+    
+    # Frames with start <= time < end
+    first = np.searchsorted(pitch_times, onsets)
+    last = np.searchsorted(pitch_times, window_ends)
+    
+    median_freqs = np.zeros(n)
+    mean_confs = np.zeros(n)
+    counts = np.zeros(n, dtype=np.int64)
+    
+    for i in range(n):
+        count = last[i] - first[i]
+        if count > 0:
+            median_freqs[i] = np.median(pitch_freqs[first[i]:last[i]])
+            mean_confs[i] = np.mean(pitch_confs[first[i]:last[i]])
+            counts[i] = count
+    
+    return window_ends, median_freqs, mean_confs, counts
+
 
 class EnhancedAudioAnalyzer:
     """Advanced audio analyzer with AI-powered pitch detection"""
@@ -22,6 +77,8 @@ class EnhancedAudioAnalyzer:
     def __init__(self):
         self.logger = logger
         self.sample_rate = 22050
+        self.n_fft = 2048
+        self.hop_length = 512
         self.use_crepe = CREPE_AVAILABLE  # CREPE is a state-of-the-art pitch tracker
     
     def analyze(
@@ -59,14 +116,17 @@ class EnhancedAudioAnalyzer:
                 pitches = self._extract_pitches_librosa(audio, sr)
                 self.logger.info("Using librosa for pitch detection")
             
+            # One STFT shared by onsets, tempo, dynamics and timbre
+            magnitude, mel_db, onset_env, beat_env = self._compute_spectral_features(audio, sr)
+            
             # Advanced onset detection
-            onsets = self._detect_note_onsets_advanced(audio, sr, instrument)
+            onsets = self._detect_note_onsets_advanced(onset_env, sr, instrument)
             
             # Tempo estimation with confidence
-            tempo, tempo_confidence = self._estimate_tempo_advanced(audio, sr)
+            tempo, tempo_confidence = self._estimate_tempo_advanced(beat_env, sr)
             
             # Detailed dynamics analysis
-            dynamics = self._analyze_dynamics_advanced(audio, sr)
+            dynamics = self._analyze_dynamics_advanced(magnitude, sr)
             
             # Advanced rhythm analysis
             rhythm = self._analyze_rhythm_advanced(audio, sr, onsets)
@@ -75,7 +135,7 @@ class EnhancedAudioAnalyzer:
             notes = self._extract_notes_advanced(audio, sr, pitches, onsets, instrument)
             
             # Timbre analysis for instrument verification
-            timbre_features = self._analyze_timbre(audio, sr)
+            timbre_features = self._analyze_timbre(audio, sr, magnitude, mel_db)
             
             # Articulation analysis
             articulation = self._analyze_articulation(audio, sr, onsets)
@@ -144,16 +204,8 @@ class EnhancedAudioAnalyzer:
                 model_capacity='full'  # Use full model for best accuracy
             )
             
-            pitches = []
-            for t, f, c in zip(time, frequency, confidence):
-                if c > 0.7 and f > 0:  # High confidence threshold
-                    note = librosa.hz_to_note(f)
-                    pitches.append({
-                        'time': float(t),
-                        'frequency': float(f),
-                        'note': note,
-                        'confidence': float(c)
-                    })
+            keep = (confidence > 0.7) & (frequency > 0)  # High confidence threshold
+            pitches = self._pitches_to_dicts(time[keep], frequency[keep], confidence[keep])
             
             return pitches
             
@@ -171,25 +223,55 @@ class EnhancedAudioAnalyzer:
             fill_na=None
         )
         
-        pitches = []
         hop_length = 512
-        times = librosa.frames_to_time(range(len(f0)), sr=sr, hop_length=hop_length)
-        
-        for i, (time, freq, voiced, prob) in enumerate(zip(times, f0, voiced_flag, voiced_probs)):
-            if voiced and not np.isnan(freq) and prob > 0.6:
-                note = librosa.hz_to_note(freq)
-                pitches.append({
-                    'time': float(time),
-                    'frequency': float(freq),
-                    'note': note,
-                    'confidence': float(prob)
-                })
-        
-        return pitches
+        times = librosa.frames_to_time(np.arange(len(f0)), sr=sr, hop_length=hop_length)
+        
+        # Voiced, confident frames with a defined f0
+        keep = voiced_flag & (voiced_probs > 0.6) & ~np.isnan(f0)
+        return self._pitches_to_dicts(times[keep], f0[keep], voiced_probs[keep])
+    
+    def _pitches_to_dicts(
+        self,
+        times: np.ndarray,
+        frequencies: np.ndarray,
+        confidences: np.ndarray
+    ) -> List[Dict]:
+        """Build pitch dicts from parallel arrays, naming all notes in one call"""
+        if len(frequencies) == 0:
+            return []
+        
+        notes = np.atleast_1d(librosa.hz_to_note(frequencies)).tolist()
+        
+        return [
+            {'time': t, 'frequency': f, 'note': n, 'confidence': c}
+            for t, f, n, c in zip(times.tolist(), frequencies.tolist(), notes, confidences.tolist())
+        ]
+    
+    def _compute_spectral_features(self, audio: np.ndarray, sr: int) -> tuple:
+        """
+        Compute the spectral representations the analysis steps share
+        
+        Args:
+            audio: Audio signal
+            sr: Sample rate
+            
+        Returns:
+            Tuple of (STFT magnitude, log-power mel spectrogram, onset strength
+            envelope for onset detection (mean over mel bands), envelope for beat
+            tracking (median, as librosa's beat tracker uses))
+        """
+        magnitude = np.abs(librosa.stft(audio, n_fft=self.n_fft, hop_length=self.hop_length))
+        
+        # Same mel/dB front end onset_strength and mfcc build from y by default
+        mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr))
+        onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr)
+        beat_env = librosa.onset.onset_strength(S=mel_db, sr=sr, aggregate=np.median)
+        
+        return magnitude, mel_db, onset_env, beat_env
     
     def _detect_note_onsets_advanced(
         self,
-        audio: np.ndarray,
+        onset_env: np.ndarray,
         sr: int,
         instrument: str
     ) -> np.ndarray:
@@ -198,7 +280,7 @@ class EnhancedAudioAnalyzer:
         if instrument in ['timpani', 'xylophone', 'marimba']:
             # Percussive instruments - use energy-based detection
             onset_frames = librosa.onset.onset_detect(
-                y=audio,
+                onset_envelope=onset_env,
                 sr=sr,
                 units='frames',
                 backtrack=True,
@@ -212,23 +294,21 @@ class EnhancedAudioAnalyzer:
         else:
             # Pitched instruments - use spectral flux
             onset_frames = librosa.onset.onset_detect(
-                y=audio,
+                onset_envelope=onset_env,
                 sr=sr,
                 units='frames',
                 backtrack=True
             )
         
-        onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+        onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=self.hop_length)
         return onset_times
     
-    def _estimate_tempo_advanced(self, audio: np.ndarray, sr: int) -> tuple[float, float]:
+    def _estimate_tempo_advanced(self, beat_env: np.ndarray, sr: int) -> tuple[float, float]:
         """Estimate tempo with confidence score"""
-        # Use multiple methods for robust estimation
-        tempo_static, beats = librosa.beat.beat_track(y=audio, sr=sr)
+        # The shared median envelope feeds the beat tracker (it would otherwise recompute it)
+        tempo_static, beat_frames = librosa.beat.beat_track(onset_envelope=beat_env, sr=sr)
         
-        # Calculate tempo confidence based on beat strength
-        onset_env = librosa.onset.onset_strength(y=audio, sr=sr)
-        beat_frames = librosa.beat.beat_track(y=audio, sr=sr, onset_envelope=onset_env)[1]
+        # Calculate tempo confidence based on beat regularity
         
         if len(beat_frames) > 2:
             # Calculate inter-beat intervals
@@ -244,44 +324,23 @@ class EnhancedAudioAnalyzer:
         
         return float(tempo_static), float(confidence)
     
-    def _analyze_dynamics_advanced(self, audio: np.ndarray, sr: int) -> List[Dict]:
+    def _analyze_dynamics_advanced(self, magnitude: np.ndarray, sr: int) -> List[Dict]:
         """Advanced dynamics analysis with more granular levels"""
-        # Use both RMS and spectral centroid for better dynamics detection
-        rms = librosa.feature.rms(y=audio, frame_length=2048, hop_length=512)[0]
+        # Frame energy from the shared STFT magnitude
+        rms = librosa.feature.rms(S=magnitude, frame_length=self.n_fft, hop_length=self.hop_length)[0]
         
         # Convert to dB scale
         rms_db = librosa.amplitude_to_db(rms, ref=np.max)
         
-        hop_length = 512
-        times = librosa.frames_to_time(range(len(rms)), sr=sr, hop_length=hop_length)
-        
-        dynamics = []
-        for time, db in zip(times, rms_db):
-            # More detailed dynamic classification
-            if db > -5:
-                level = 'fff'  # fortississimo
-            elif db > -12:
-                level = 'ff'   # fortissimo
-            elif db > -18:
-                level = 'f'    # forte
-            elif db > -25:
-                level = 'mf'   # mezzo-forte
-            elif db > -32:
-                level = 'mp'   # mezzo-piano
-            elif db > -40:
-                level = 'p'    # piano
-            elif db > -50:
-                level = 'pp'   # pianissimo
-            else:
-                level = 'ppp'  # pianississimo
-            
-            dynamics.append({
-                'time': float(time),
-                'db': float(db),
-                'level': level
-            })
+        times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=self.hop_length)
+        
+        # More detailed dynamic classification, all frames at once
+        levels = DYNAMIC_LEVELS[np.searchsorted(DYNAMIC_DB_BOUNDARIES, rms_db, side='left')]
         
-        return dynamics
+        return [
+            {'time': t, 'db': db, 'level': level}
+            for t, db, level in zip(times.tolist(), rms_db.tolist(), levels.tolist())
+        ]
     
     def _analyze_rhythm_advanced(
         self,
@@ -311,17 +370,10 @@ class EnhancedAudioAnalyzer:
         # Simple syncopation measure (deviation from regular grid)
         tempo = 120  # Assumed tempo
         beat_duration = 60.0 / tempo
-        syncopation = 0.0
-        
-        if len(onsets) > 0:
-            # Calculate how far onsets are from nearest beat
-            deviations = []
-            for onset in onsets:
-                nearest_beat = round(onset / beat_duration) * beat_duration
-                deviation = abs(onset - nearest_beat)
-                deviations.append(deviation)
-            
-            syncopation = float(np.mean(deviations))
+        
+        # Mean distance of the onsets from their nearest beat
+        nearest_beats = np.round(onsets / beat_duration) * beat_duration
+        syncopation = float(np.mean(np.abs(onsets - nearest_beats)))
         
         return {
             'inter_onset_intervals': iois.tolist(),
@@ -341,52 +393,56 @@ class EnhancedAudioAnalyzer:
         instrument: str
     ) -> List[Dict]:
         """Advanced note extraction with better segmentation"""
-        notes = []
-        
         if len(onsets) == 0:
-            return notes
+            return []
         
-        for i, onset_time in enumerate(onsets):
-            # Define window
-            window_start = onset_time
-            window_end = onsets[i + 1] if i + 1 < len(onsets) else len(audio) / sr
-            
-            # Find pitches in window
-            window_pitches = [
-                p for p in pitches
-                if window_start <= p['time'] < window_end
-            ]
-            
-            if window_pitches:
-                # Use median pitch for robustness
-                frequencies = [p['frequency'] for p in window_pitches]
-                confidences = [p['confidence'] for p in window_pitches]
-                
-                median_freq = np.median(frequencies)
-                mean_confidence = np.mean(confidences)
-                
-                note_name = librosa.hz_to_note(median_freq)
-                
-                notes.append({
-                    'start_time': float(onset_time),
-                    'duration': float(window_end - window_start),
-                    'pitch': note_name,
-                    'frequency': float(median_freq),
-                    'confidence': float(mean_confidence),
-                    'num_samples': len(window_pitches)
-                })
-        
-        return notes
+        onsets = np.asarray(onsets, dtype=np.float64)
+        pitch_times = np.array([p['time'] for p in pitches], dtype=np.float64)
+        pitch_freqs = np.array([p['frequency'] for p in pitches], dtype=np.float64)
+        pitch_confs = np.array([p['confidence'] for p in pitches], dtype=np.float64)
+        
+        # Use median pitch per onset window for robustness
+        window_ends, median_freqs, mean_confs, counts = segment_notes(
+            onsets, len(audio) / sr, pitch_times, pitch_freqs, pitch_confs
+        )
+        
+        found = counts > 0
+        if not found.any():
+            return []
+        
+        starts = onsets[found]
+        note_names = np.atleast_1d(librosa.hz_to_note(median_freqs[found])).tolist()
+        
+        return [
+            {
+                'start_time': start,
+                'duration': duration,
+                'pitch': name,
+                'frequency': freq,
+                'confidence': conf,
+                'num_samples': count
+            }
+            for start, duration, name, freq, conf, count in zip(
+                starts.tolist(), (window_ends[found] - starts).tolist(), note_names,
+                median_freqs[found].tolist(), mean_confs[found].tolist(), counts[found].tolist()
+            )
+        ]
     
-    def _analyze_timbre(self, audio: np.ndarray, sr: int) -> Dict[str, Any]:
+    def _analyze_timbre(
+        self,
+        audio: np.ndarray,
+        sr: int,
+        magnitude: np.ndarray,
+        mel_db: np.ndarray
+    ) -> Dict[str, Any]:
         """Analyze timbre features for instrument verification"""
-        # Extract spectral features
-        spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=audio, sr=sr))
-        spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=audio, sr=sr))
+        # Extract spectral features from the shared STFT magnitude
+        spectral_centroid = np.mean(librosa.feature.spectral_centroid(S=magnitude, sr=sr))
+        spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(S=magnitude, sr=sr))
         zero_crossing_rate = np.mean(librosa.feature.zero_crossing_rate(audio))
         
-        # Extract MFCCs
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
+        # Extract MFCCs from the shared log-mel spectrogram
+        mfccs = librosa.feature.mfcc(S=mel_db, sr=sr, n_mfcc=13)
         mfcc_mean = np.mean(mfccs, axis=1)
         
         return {
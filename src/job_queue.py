@@ -0,0 +1,119 @@
+"""
+Job Queue - Runs long analyses in the background and tracks their status
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+from src.database import db_session, AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+# Jobs live only in the worker that accepted them, so a restart, deploy or
+# frozen serverless function leaves their rows queued/running for good.
+# Unfinished jobs untouched for this long are reported as failed.
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 900))
+
+# Same options as the Flask JSON provider, so NumPy values in results serialize
+JOB_RESULT_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class JobQueue:
+    """
+    Background job runner for analysis pipelines
+
+    Job state is persisted in the database so any gunicorn worker can answer
+    a status poll, not just the one that accepted the job.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the job queue
+
+        Args:
+            max_workers: Number of concurrent jobs (defaults to ANALYSIS_WORKERS
+                         or the number of CPU cores)
+        """
+        self.logger = logger
+        if max_workers is None:
+            max_workers = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mugic-job')
+
+    def submit(self, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> str:
+        """
+        Queue a job for background execution
+
+        Args:
+            func: Callable returning a JSON-serializable result dict
+            *args, **kwargs: Arguments passed to func
+
+        Returns:
+            ID of the queued job
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+
+        try:
+            db_session.add(AnalysisJob(id=job_id, status='queued', created_at=now, updated_at=now))
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            self.logger.error(f"Error queueing job: {str(e)}")
+            raise
+
+        self.executor.submit(self._run, job_id, func, args, kwargs)
+        self.logger.info(f"Queued job {job_id}")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status (and result, once finished) of a job"""
+        job = db_session.query(AnalysisJob).filter_by(id=job_id).first()
+
+        if not job:
+            return None
+
+        if job.status in ('queued', 'running') and \
+           datetime.utcnow() - job.updated_at > timedelta(seconds=JOB_STALE_SECONDS):
+            self.logger.warning(f"Job {job_id} went stale while {job.status}")
+            self._update(job_id, status='failed', error='Job was interrupted; please try again')
+
+        return {
+            'job_id': job.id,
+            'status': job.status,
+            'result': orjson.loads(job.result) if job.result else None,
+            'error': job.error,
+            'created_at': job.created_at.isoformat(),
+            'updated_at': job.updated_at.isoformat()
+        }
+
+    def _run(self, job_id: str, func: Callable, args: tuple, kwargs: dict):
+        """Execute a job on a worker thread and record its outcome"""
+        try:
+            self._update(job_id, status='running')
+            result = func(*args, **kwargs)
+            result_json = orjson.dumps(result, option=JOB_RESULT_OPTIONS).decode('utf-8')
+            self._update(job_id, status='completed', result=result_json)
+            self.logger.info(f"Job {job_id} completed")
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {str(e)}")
+            self._update(job_id, status='failed', error=str(e))
+        finally:
+            # Worker threads get their own scoped session; release it
+            db_session.remove()
+
+    def _update(self, job_id: str, **fields):
+        """Persist job status changes"""
+        try:
+            job = db_session.query(AnalysisJob).filter_by(id=job_id).first()
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = datetime.utcnow()
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            self.logger.error(f"Error updating job {job_id}: {str(e)}")
@@ -0,0 +1,31 @@
+"""
+orjson-backed JSON provider for Flask
+"""
+from typing import Any
+
+import orjson
+from flask import Response
+from flask.json.provider import JSONProvider, _default
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Serializes responses with orjson instead of the stdlib json module
+    Also handles numpy arrays and scalars returned by the audio/OMR analyzers
+    """
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data as JSON"""
+        return orjson.dumps(obj, default=_default, option=self.option).decode('utf-8')
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        """Deserialize data as JSON"""
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """Build a JSON response from the encoded bytes, skipping the str round-trip"""
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self.option)
+        return self._app.response_class(body, mimetype='application/json')
@@ -0,0 +1,408 @@
+"""
+Streaming MusicXML parser
+Extracts notes, rhythms and basic metadata without building a music21 Score
+"""
+import logging
+import math
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import Dict, List, Any, Tuple, Union, BinaryIO
+
+import numpy as np
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Set MUSICXML_PARSER=music21 to route everything through the music21 fallback
+USE_MUSIC21_PARSER = os.environ.get('MUSICXML_PARSER', '').lower() == 'music21'
+
+# Semitone offset of each natural step from C
+STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# Tonic for each <fifths> value (music21 spelling: '-' for flat)
+MAJOR_TONICS = {
+    -7: 'C-', -6: 'G-', -5: 'D-', -4: 'A-', -3: 'E-', -2: 'B-', -1: 'F',
+    0: 'C', 1: 'G', 2: 'D', 3: 'A', 4: 'E', 5: 'B', 6: 'F#', 7: 'C#'
+}
+MINOR_TONICS = {
+    -7: 'A-', -6: 'E-', -5: 'B-', -4: 'F', -3: 'C', -2: 'G', -1: 'D',
+    0: 'A', 1: 'E', 2: 'B', 3: 'F#', 4: 'C#', 5: 'G#', 6: 'D#', 7: 'A#'
+}
+
+# Parsed notes are kept column-wise in one structured array; dicts are only
+# built at the API boundary (see note_dicts)
+NOTE_DTYPE = np.dtype([
+    ('pitch', 'U8'),
+    ('midi_note', 'i2'),
+    ('start_time', 'f8'),
+    ('duration', 'f8'),
+    ('velocity', 'u1'),
+    ('type', 'U16'),
+])
+
+DEFAULT_VELOCITY = 80
+
+# Elements the parser reacts to; everything else is skipped by libxml2
+# (or ignored in the loop when falling back to ElementTree)
+_TAGS = ('part', 'measure', 'attributes', 'note', 'backup', 'forward', 'sound', 'metronome')
+_TAG_SET = frozenset(_TAGS)
+
+
+def _iterparse(source):
+    """
+    Start/end events for the tags in _TAGS
+
+    Uses lxml's tag-filtered iterparse when available, otherwise the stdlib
+    ElementTree iterparse (which yields every element, so filter here).
+
+    Args:
+        source: File path or binary file object
+
+    Returns:
+        Iterator of (event, element) pairs
+    """
+    if LXML_AVAILABLE:
+        return etree.iterparse(source, events=('start', 'end'), tag=_TAGS)
+
+    return (
+        (event, elem) for event, elem in ET.iterparse(source, events=('start', 'end'))
+        if elem.tag in _TAG_SET
+    )
+
+
+def _note_array(pitches: List[str], midi_notes: List[int], start_times: List[float],
+                durations: List[float], types: List[Any]) -> np.ndarray:
+    """
+    Pack parallel note columns into a NOTE_DTYPE array
+
+    Args:
+        pitches, midi_notes, start_times, durations, types: One entry per note
+
+    Returns:
+        Structured array of notes
+    """
+    notes = np.empty(len(pitches), dtype=NOTE_DTYPE)
+    notes['pitch'] = pitches
+    notes['midi_note'] = midi_notes
+    notes['start_time'] = start_times
+    notes['duration'] = durations
+    notes['velocity'] = DEFAULT_VELOCITY
+    notes['type'] = [t or '' for t in types]
+    return notes
+
+
+def note_dicts(notes: np.ndarray) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Materialize the note and rhythm dicts returned by the analysis APIs
+
+    Args:
+        notes: NOTE_DTYPE array from parse_musicxml / parse_musicxml_music21
+
+    Returns:
+        Tuple of (notes, rhythms) lists of dicts
+    """
+    pitches = notes['pitch'].tolist()
+    midi_notes = notes['midi_note'].tolist()
+    start_times = notes['start_time'].tolist()
+    durations = notes['duration'].tolist()
+    velocities = notes['velocity'].tolist()
+    types = [t or None for t in notes['type'].tolist()]
+
+    notes_list = [
+        {'pitch': p, 'midi_note': m, 'start_time': s, 'duration': d, 'velocity': v}
+        for p, m, s, d, v in zip(pitches, midi_notes, start_times, durations, velocities)
+    ]
+    rhythms_list = [
+        {'type': t, 'duration': d, 'start_time': s}
+        for t, d, s in zip(types, durations, start_times)
+    ]
+    return notes_list, rhythms_list
+
+
+def _mxl_rootfile(zf: zipfile.ZipFile) -> str:
+    """
+    Name of the score document inside a compressed .mxl archive
+
+    Args:
+        zf: Open .mxl archive
+
+    Returns:
+        Archive member holding the MusicXML score
+    """
+    names = zf.namelist()
+
+    # META-INF/container.xml points at the score; fall back to the first XML file
+    if 'META-INF/container.xml' in names:
+        container = ET.fromstring(zf.read('META-INF/container.xml'))
+        for elem in container.iter():
+            if elem.tag.rsplit('}', 1)[-1] == 'rootfile' and elem.get('full-path'):
+                return elem.get('full-path')
+
+    return next(
+        name for name in names
+        if not name.startswith('META-INF/') and name.endswith(('.xml', '.musicxml'))
+    )
+
+
+def parse_musicxml(musicxml_path: Union[str, BinaryIO]) -> Dict[str, Any]:
+    """
+    Parse an uncompressed partwise MusicXML file in a single streaming pass
+
+    Works with lxml or, when it is missing, the stdlib ElementTree.
+
+    Args:
+        musicxml_path: Path to .xml/.musicxml file, or a binary file object
+
+    Returns:
+        Dictionary with the note_array (NOTE_DTYPE, ordered by onset),
+        time/key signature, tempo, measure count and number of parts
+    """
+    pitches: List[str] = []
+    midi_notes: List[int] = []
+    start_times: List[float] = []
+    durations: List[float] = []
+    types: List[Any] = []
+
+    time_signature = None
+    key_signature = None
+    tempo_marking = None
+    num_parts = 0
+    measures_first_part = 0
+
+    divisions = 1.0
+    current_time = 0.0  # In quarter lengths from the start of the part
+    last_note_start = 0.0
+    current_part = None
+
+    for event, elem in _iterparse(musicxml_path):
+        tag = elem.tag
+
+        if event == 'start':
+            if tag == 'part':
+                current_part = elem
+                num_parts += 1
+                divisions = 1.0
+                current_time = 0.0
+                last_note_start = 0.0
+            continue
+
+        if tag == 'note':
+            if elem.find('grace') is not None:
+                elem.clear()
+                continue
+
+            duration = float(elem.findtext('duration') or 0) / divisions
+            is_chord_tone = elem.find('chord') is not None
+            start_time = last_note_start if is_chord_tone else current_time
+
+            pitch = elem.find('pitch')
+            if pitch is not None:
+                step = pitch.findtext('step')
+                octave = int(pitch.findtext('octave'))
+                alter = int(round(float(pitch.findtext('alter') or 0)))
+                accidental = '#' * alter if alter > 0 else '-' * -alter
+
+                pitches.append(f"{step}{accidental}{octave}")
+                midi_notes.append((octave + 1) * 12 + STEP_SEMITONES[step] + alter)
+                start_times.append(start_time)
+                durations.append(duration)
+                types.append(elem.findtext('type'))
+
+            if not is_chord_tone:
+                last_note_start = current_time
+                current_time += duration
+
+        elif tag == 'backup':
+            current_time -= float(elem.findtext('duration') or 0) / divisions
+
+        elif tag == 'forward':
+            current_time += float(elem.findtext('duration') or 0) / divisions
+
+        elif tag == 'attributes':
+            divisions_text = elem.findtext('divisions')
+            if divisions_text:
+                divisions = float(divisions_text)
+
+            if time_signature is None and elem.find('time/beats') is not None:
+                time_signature = f"{elem.findtext('time/beats')}/{elem.findtext('time/beat-type')}"
+
+            if key_signature is None and elem.find('key/fifths') is not None:
+                fifths = int(elem.findtext('key/fifths'))
+                tonics = MINOR_TONICS if elem.findtext('key/mode') == 'minor' else MAJOR_TONICS
+                key_signature = tonics.get(fifths, 'C')
+
+            elem.clear()
+
+        elif tag == 'sound':
+            if tempo_marking is None and elem.get('tempo'):
+                tempo_marking = int(float(elem.get('tempo')))
+
+        elif tag == 'metronome':
+            if tempo_marking is None and elem.findtext('per-minute'):
+                try:
+                    tempo_marking = int(float(elem.findtext('per-minute')))
+                except ValueError:
+                    pass
+
+        elif tag == 'measure':
+            if num_parts == 1:
+                measures_first_part += 1
+
+            # Drop the finished measure to keep memory flat
+            elem.clear()
+            if current_part is not None:
+                current_part.remove(elem)
+
+    notes = _note_array(pitches, midi_notes, start_times, durations, types)
+
+    # Voices are written one after another; order notes by onset like music21 does
+    notes = notes[np.argsort(notes['start_time'], kind='stable')]
+
+    return {
+        'note_array': notes,
+        'time_signature': time_signature or '4/4',
+        'key_signature': key_signature or 'C',
+        'tempo': tempo_marking or 120,
+        'total_measures': measures_first_part,
+        'num_parts': num_parts
+    }
+
+
+@lru_cache(maxsize=4096)
+def _duration_info(quarter_length) -> Tuple[float, str]:
+    """
+    Float length and note type for a music21 quarterLength
+
+    Scores reuse a handful of durations, so this saturates almost immediately.
+
+    Args:
+        quarter_length: music21 quarterLength (float or Fraction)
+
+    Returns:
+        Tuple of (duration in quarter lengths, duration type name)
+    """
+    from music21 import duration
+
+    return float(quarter_length), duration.Duration(quarter_length).type
+
+
+@lru_cache(maxsize=512)
+def _pitch_info(name: str, octave: int) -> Tuple[str, int]:
+    """
+    Spelled name and MIDI number for a pitch class and octave
+
+    Keyed on the spelling rather than pitch.ps so C#4 and D-4 stay distinct.
+
+    Args:
+        name: music21 pitch name (e.g. 'C#', 'B-')
+        octave: Octave number
+
+    Returns:
+        Tuple of (name with octave, MIDI note number)
+    """
+    from music21 import pitch
+
+    return f"{name}{octave}", pitch.Pitch(name, octave=octave).midi
+
+
+def parse_musicxml_music21(musicxml_path: str) -> Dict[str, Any]:
+    """
+    Parse MusicXML (including compressed .mxl) with music21
+
+    Much slower than parse_musicxml; only used when MUSICXML_PARSER=music21.
+    The flattened score is walked once, collecting notes and the first time
+    signature, key signature and tempo along the way.
+
+    Args:
+        musicxml_path: Path to .xml/.musicxml/.mxl file
+
+    Returns:
+        Dictionary with the same keys as parse_musicxml
+    """
+    from music21 import converter, note, meter, key, tempo
+
+    score = converter.parse(musicxml_path)
+
+    pitches: List[str] = []
+    midi_notes: List[int] = []
+    start_times: List[float] = []
+    durations: List[float] = []
+    types: List[Any] = []
+
+    time_signature = None
+    measure_length = 4.0  # Quarter lengths per measure (4/4 until a time signature says otherwise)
+    key_signature = None
+    tempo_marking = None
+
+    flat = score.flatten()
+    for element in flat:
+        if isinstance(element, note.Note):
+            start_time = float(element.offset)
+            duration, duration_type = _duration_info(element.duration.quarterLength)
+            name_with_octave, midi_note = _pitch_info(
+                element.pitch.name, element.pitch.implicitOctave
+            )
+
+            pitches.append(name_with_octave)
+            midi_notes.append(midi_note)
+            start_times.append(start_time)
+            durations.append(duration)
+            types.append(duration_type)
+
+        elif isinstance(element, meter.TimeSignature):
+            if time_signature is None:
+                time_signature = element.ratioString
+                measure_length = float(element.barDuration.quarterLength) or measure_length
+
+        elif isinstance(element, key.KeySignature):
+            if key_signature is None:
+                key_signature = element.asKey().tonic.name
+
+        elif isinstance(element, tempo.MetronomeMark):
+            if tempo_marking is None and element.number:
+                tempo_marking = int(element.number)
+
+    # Derive the measure count from the score length instead of filtering the measures
+    measures = math.ceil(float(flat.highestTime) / measure_length)
+
+    return {
+        'note_array': _note_array(pitches, midi_notes, start_times, durations, types),
+        'time_signature': time_signature or '4/4',
+        'key_signature': key_signature or 'C',
+        'tempo': tempo_marking or 120,
+        'total_measures': measures,
+        'num_parts': len(score.parts)
+    }
+
+
+def parse_score(musicxml_path: str) -> Dict[str, Any]:
+    """
+    Parse a MusicXML export with the fastest parser that can read it
+
+    Plain MusicXML is streamed from disk; compressed .mxl is streamed straight
+    out of the archive. MUSICXML_PARSER=music21 routes everything through
+    music21 instead.
+
+    Args:
+        musicxml_path: Path to .xml/.musicxml/.mxl file
+
+    Returns:
+        Dictionary with the note_array, time/key signature, tempo,
+        measure count and number of parts
+    """
+    if USE_MUSIC21_PARSER:
+        return parse_musicxml_music21(musicxml_path)
+
+    if musicxml_path.endswith('.mxl'):
+        # Decompress while parsing so memory stays flat however large the score
+        with zipfile.ZipFile(musicxml_path) as zf, zf.open(_mxl_rootfile(zf)) as score_file:
+            return parse_musicxml(score_file)
+
+    return parse_musicxml(musicxml_path)
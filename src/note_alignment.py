@@ -0,0 +1,143 @@
+"""
+Note alignment kernels
+Match performed notes against sheet music notes on NumPy arrays
+"""
+import re
+from typing import Dict, List, Any, Optional, Union
+
+import numpy as np
+
+from src.numba_compat import njit, prange
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def match_onsets(expected_times: np.ndarray, played_times: np.ndarray, window: float) -> np.ndarray:
+    """
+    Find the closest played note for every expected note
+
+    Args:
+        expected_times: Onsets of expected notes (float64[:])
+        played_times: Onsets of played notes, sorted ascending (float64[:])
+        window: Maximum onset difference for a match
+
+    Returns:
+        Index into played_times for each expected note, or -1 if none is within the window
+    """
+    n_expected = expected_times.shape[0]
+    n_played = played_times.shape[0]
+    matches = np.full(n_expected, -1, dtype=np.int64)
+
+    for i in prange(n_expected):
+        best_diff = window
+        for j in range(n_played):
+            diff = abs(played_times[j] - expected_times[i])
+            if diff < best_diff:
+                best_diff = diff
+                matches[i] = j
+
+    return matches
+
+
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+
+def midi_to_name(midi_note: int) -> str:
+    """Convert a MIDI note number to a name like 'C#4'"""
+    return f"{NOTE_NAMES[midi_note % 12]}{midi_note // 12 - 1}"
+
+
+# Letter, accidentals ('#', 'b' or music21's '-' for flat) and octave
+NOTE_NAME_RE = re.compile(r'^([A-Ga-g])([#b-]*)(\d+)$')
+LETTER_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+
+def name_to_midi(name: str) -> int:
+    """Convert a note name like 'C#4', 'Bb3' or 'B-3' to a MIDI note number"""
+    match = NOTE_NAME_RE.match(name.strip())
+    if match is None:
+        raise ValueError(f"Not a note name: {name!r}")
+    letter, accidentals, octave = match.groups()
+    alteration = accidentals.count('#') - accidentals.count('b') - accidentals.count('-')
+    return (int(octave) + 1) * 12 + LETTER_SEMITONES[letter.upper()] + alteration
+
+
+def pitch_to_midi(pitch: Union[int, str]) -> int:
+    """MIDI note number of a pitch given either as a number or as a note name"""
+    return name_to_midi(pitch) if isinstance(pitch, str) else int(pitch)
+
+
+_NOTE_NAME_ARRAY = np.array(NOTE_NAMES)
+
+
+def hz_to_names(frequencies: np.ndarray) -> np.ndarray:
+    """
+    Convert frequencies to note names like 'C#4' in one vectorized pass
+
+    Args:
+        frequencies: Frequencies in Hz (all positive)
+
+    Returns:
+        Array of note names, rounded to the nearest semitone
+    """
+    midi = np.round(69 + 12 * np.log2(np.asarray(frequencies) / 440.0)).astype(np.int16)
+    return np.char.add(_NOTE_NAME_ARRAY[midi % 12], (midi // 12 - 1).astype(str))
+
+
+def empty_note_arrays() -> Dict[str, Any]:
+    """Structure-of-arrays note container with no notes"""
+    return {
+        'n': 0,
+        'pitch': np.zeros(0, dtype=np.int16),
+        'onset_sec': np.zeros(0, dtype=np.float64),
+        'dur_sec': np.zeros(0, dtype=np.float32),
+        'velocity': np.zeros(0, dtype=np.float32)
+    }
+
+
+def notes_to_arrays(notes: List[Dict[str, Any]], tempo: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Convert a list of note dicts into parallel NumPy arrays
+
+    Pitches may be MIDI numbers (midi_note, or a numeric pitch) or note names
+    like 'C4'. Onsets are read from start, or from start_time when there is
+    none; with a tempo, times are quarter lengths and are converted to seconds.
+
+    Args:
+        notes: Notes from an OMR or audio analysis
+        tempo: Tempo in BPM for notes timed in quarter lengths (None for seconds)
+
+    Returns:
+        Dictionary with n, pitch, onset_sec, dur_sec and velocity arrays
+    """
+    if not notes:
+        return empty_note_arrays()
+
+    seconds_per_quarter = 60.0 / (tempo or 120) if tempo is not None else 1.0
+    onset_key = 'start' if 'start' in notes[0] else 'start_time'
+    pitch = [pitch_to_midi(n['midi_note'] if 'midi_note' in n else n['pitch']) for n in notes]
+    onset = [n.get(onset_key, 0) * seconds_per_quarter for n in notes]
+    duration = [n.get('duration', 0) * seconds_per_quarter for n in notes]
+
+    return {
+        'n': len(notes),
+        'pitch': np.array(pitch, dtype=np.int16),
+        'onset_sec': np.array(onset, dtype=np.float64),
+        'dur_sec': np.array(duration, dtype=np.float32),
+        'velocity': np.array([n.get('velocity', 80) for n in notes], dtype=np.float32)
+    }
+
+
+def get_note_arrays(analysis: Dict[str, Any], quarter_lengths: bool = False) -> Dict[str, Any]:
+    """
+    Build the structure-of-arrays notes of an analysis from its notes
+
+    Args:
+        analysis: OMR or audio analysis
+        quarter_lengths: Notes are timed in quarter lengths at the analysis'
+                         tempo (sheet music) rather than in seconds
+
+    Returns:
+        Dictionary with n, pitch, onset_sec, dur_sec and velocity arrays
+    """
+    tempo = analysis.get('tempo', 120) if quarter_lengths else None
+    return notes_to_arrays(analysis.get('notes', []), tempo)
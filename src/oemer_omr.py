@@ -8,13 +8,21 @@ Enhanced with AI-based advanced notation detection
 """
 import os
 import tempfile
+import weakref
 import logging
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 import shutil
 
+from src.musicxml_parser import parse_score, note_dicts
+
 logger = logging.getLogger(__name__)
 
+# PDF pages are rendered at 3x their 72 DPI point size (216 DPI) for OEMER;
+# the notation detector scales its pixel limits to the same resolution
+PDF_RENDER_ZOOM = 3
+PDF_RENDER_DPI = 72 * PDF_RENDER_ZOOM
+
 
 class OemerOMR:
     """
@@ -28,11 +36,14 @@ class OemerOMR:
         self.logger = logger
         self.oemer_available = self._check_oemer_available()
         self.temp_dir = tempfile.mkdtemp(prefix='mugic_oemer_')
+        # Removes the directory at garbage collection or interpreter exit,
+        # even if cleanup() is never called
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.temp_dir, ignore_errors=True)
         
         # Initialize advanced notation detector
         try:
             from src.advanced_notation_detector import AdvancedNotationDetector
-            self.advanced_detector = AdvancedNotationDetector()
+            self.advanced_detector = AdvancedNotationDetector(dpi=PDF_RENDER_DPI)
             self.has_advanced_detection = True
             self.logger.info("✓ Advanced notation detection enabled")
         except Exception as e:
@@ -137,9 +148,7 @@ class OemerOMR:
             page = doc[0]
             
             # Render at high resolution for better OMR accuracy
-            # OEMER works best with high-resolution images (300 DPI equivalent)
-            zoom = 3  # 3x resolution for optimal quality
-            mat = fitz.Matrix(zoom, zoom)
+            mat = fitz.Matrix(PDF_RENDER_ZOOM, PDF_RENDER_ZOOM)
             pix = page.get_pixmap(matrix=mat)
             
             # Save as PNG (lossless format, best for OMR)
@@ -216,67 +225,19 @@ class OemerOMR:
             Analysis dictionary with notes, rhythms, metadata
         """
         try:
-            from music21 import converter
-            
-            # Parse MusicXML
-            score = converter.parse(musicxml_path)
-            
-            # Extract notes
-            notes_list = []
-            rhythms_list = []
-            
-            # Get all notes from all parts
-            for part in score.parts:
-                for element in part.flatten().notesAndRests:
-                    if hasattr(element, 'pitch') and element.pitch:
-                        # It's a note
-                        notes_list.append({
-                            'pitch': element.pitch.nameWithOctave,
-                            'midi_note': element.pitch.midi,
-                            'start_time': float(element.offset),
-                            'duration': float(element.duration.quarterLength),
-                            'velocity': 80
-                        })
-                        
-                        rhythms_list.append({
-                            'type': element.duration.type,
-                            'duration': float(element.duration.quarterLength),
-                            'start_time': float(element.offset)
-                        })
-            
-            # Extract metadata
-            time_signature = '4/4'
-            key_signature = 'C'
-            tempo_marking = 120
-            
-            # Get time signature
-            ts = score.flatten().getElementsByClass('TimeSignature')
-            if ts:
-                time_signature = ts[0].ratioString
-            
-            # Get key signature
-            ks = score.flatten().getElementsByClass('KeySignature')
-            if ks:
-                key_signature = ks[0].asKey().tonic.name
-            
-            # Get tempo
-            tempo_marks = score.flatten().getElementsByClass('MetronomeMark')
-            if tempo_marks:
-                tempo_marking = int(tempo_marks[0].number)
-            
-            # Count measures
-            measures = len(score.parts[0].getElementsByClass('Measure')) if score.parts else 0
+            parsed = parse_score(musicxml_path)
+            notes, rhythms = note_dicts(parsed['note_array'])
             
             analysis = {
-                'notes': notes_list,
-                'rhythms': rhythms_list,
-                'time_signature': time_signature,
-                'key_signature': key_signature,
-                'tempo': tempo_marking,
+                'notes': notes,
+                'rhythms': rhythms,
+                'time_signature': parsed['time_signature'],
+                'key_signature': parsed['key_signature'],
+                'tempo': parsed['tempo'],
                 'clef': 'treble',  # Default
                 'num_pages': 1,
-                'num_staves': len(score.parts),
-                'total_measures': measures,
+                'num_staves': parsed['num_parts'],
+                'total_measures': parsed['total_measures'],
                 'analysis_method': 'OEMER (End-to-end OMR)',
                 'has_real_detection': True,
                 'confidence': 0.90,  # OEMER typically has high confidence
@@ -292,12 +253,17 @@ class OemerOMR:
     def cleanup(self):
         """Clean up temporary files"""
         try:
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
+            if self._finalizer.alive:
+                self._finalizer()
                 self.logger.info("Cleaned up temporary files")
         except Exception as e:
             self.logger.warning(f"Failed to cleanup temp directory: {e}")
     
-    def __del__(self):
-        """Cleanup on deletion"""
+    def __enter__(self):
+        """Use the engine as a context manager that cleans up on exit"""
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Remove the temporary directory"""
         self.cleanup()
+        return False
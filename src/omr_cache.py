@@ -0,0 +1,110 @@
+"""
+OMR Cache - Reuses sheet music analyses for identical uploads
+"""
+import logging
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Optional, BinaryIO, Union
+from pathlib import Path
+
+from src.database import db_session, OMRCacheEntry, pack_blob, unpack_blob
+
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Read uploads in 1 MiB chunks: large enough for BLAKE3's SIMD tree hashing,
+# small enough that memory stays flat regardless of file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Uploads that fail these checks are rejected before any OMR backend runs
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_WINDOW = 1024
+MIN_PDF_SIZE = 1024
+
+
+def _new_hasher():
+    """BLAKE3 when available, otherwise BLAKE2b (both give 64 hex characters)"""
+    if BLAKE3_AVAILABLE:
+        return blake3()
+    return hashlib.blake2b(digest_size=32)
+
+
+def save_and_hash(stream: BinaryIO, filepath: Union[str, Path]) -> str:
+    """
+    Write an uploaded file to disk and hash it in the same pass
+
+    Args:
+        stream: Readable binary stream of the upload
+        filepath: Destination path
+
+    Returns:
+        Hex digest of the file contents
+    """
+    hasher = _new_hasher()
+
+    with open(filepath, 'wb') as f:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            f.write(chunk)
+
+    return hasher.hexdigest()
+
+
+def validate_pdf(filepath: Union[str, Path]):
+    """
+    Cheap sanity check that an upload is a PDF
+
+    Args:
+        filepath: Path to the uploaded file
+
+    Raises:
+        ValueError: If the file is too small or lacks the PDF header
+    """
+    if Path(filepath).stat().st_size < MIN_PDF_SIZE:
+        raise ValueError("File is too small to be a PDF")
+
+    # Readers accept the header anywhere in the first 1 KiB, so do the same
+    with open(filepath, 'rb') as f:
+        if PDF_MAGIC not in f.read(PDF_HEADER_WINDOW):
+            raise ValueError("File is not a PDF")
+
+
+class OMRCache:
+    """Content-addressed cache of OMR analyses"""
+
+    def __init__(self):
+        """Initialize the OMR cache"""
+        self.logger = logger
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Get a cached analysis by content digest"""
+        try:
+            entry = db_session.query(OMRCacheEntry).filter_by(digest=digest).first()
+            if not entry:
+                return None
+
+            self.logger.info(f"OMR cache hit: {digest}")
+            return unpack_blob(entry.analysis)
+
+        except Exception as e:
+            self.logger.warning(f"Error reading OMR cache: {str(e)}")
+            return None
+
+    def put(self, digest: str, analysis: Dict[str, Any]):
+        """Store an analysis under its content digest"""
+        try:
+            db_session.merge(OMRCacheEntry(
+                digest=digest,
+                analysis=pack_blob(analysis),
+                created_at=datetime.utcnow()
+            ))
+            db_session.commit()
+
+        except Exception as e:
+            db_session.rollback()
+            self.logger.warning(f"Error writing OMR cache: {str(e)}")
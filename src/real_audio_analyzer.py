@@ -4,7 +4,8 @@ Simplified version without TensorFlow dependency (basic-pitch removed for Python
 """
 import logging
 import os
-from typing import Dict, List, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Union
 import numpy as np
 import librosa
 import soundfile as sf
@@ -12,8 +13,31 @@ import noisereduce as nr
 import pretty_midi
 import mido
 
+from src.note_alignment import empty_note_arrays
+
+try:
+    import pyfftw
+    PYFFTW_AVAILABLE = True
+except ImportError:
+    PYFFTW_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Recordings are batched in order of length and each batch's padded stack is
+# capped at this many samples (~4 minutes at 22.05 kHz), which bounds the
+# (batch, 1025, frames) piptrack arrays no matter how long one upload is
+BATCH_MAX_SAMPLES = int(os.environ.get('AUDIO_BATCH_MAX_SAMPLES', 240 * 22050))
+
+# The plan cache is keyed by array shape, so every new recording length plans
+# afresh; FFTW_ESTIMATE keeps that cheap. One thread per transform, since the
+# analysis already runs one process per core.
+if PYFFTW_AVAILABLE:
+    pyfftw.config.NUM_THREADS = 1
+    pyfftw.config.PLANNER_EFFORT = 'FFTW_ESTIMATE'
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(3600)
+    librosa.set_fftlib(pyfftw.interfaces.numpy_fft)
+
 
 class RealAudioAnalyzer:
     """Real audio analyzer using librosa for transcription (no TensorFlow dependency)"""
@@ -21,6 +45,8 @@ class RealAudioAnalyzer:
     def __init__(self):
         self.logger = logger
         self.sample_rate = 22050
+        self.n_fft = 2048
+        self.hop_length = 512
         self.logger.info("Real Audio Analyzer initialized with librosa (TensorFlow-free)")
     
     def analyze(
@@ -44,98 +70,242 @@ class RealAudioAnalyzer:
             self.logger.info(f"Analyzing audio with librosa: {audio_path}")
             
             # Load and preprocess audio
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate)
-            
-            # Apply noise reduction if requested
-            if apply_noise_reduction:
-                audio = self._reduce_noise(audio, sr)
-            
-            # Extract notes using librosa pitch detection
-            notes = self._extract_notes_librosa(audio, sr)
-            
-            # Calculate tempo
-            tempo = self._calculate_tempo_librosa(audio, sr)
-            
-            # Analyze dynamics
-            dynamics = self._analyze_dynamics(audio, sr)
-            
-            # Analyze rhythm
-            rhythm = self._analyze_rhythm(notes)
+            audio, sr = self._load_audio(audio_path, apply_noise_reduction)
             
-            # Calculate pitch range
-            pitch_range = self._calculate_pitch_range(notes)
+            return self._analyze_audio(audio, sr, instrument)
             
-            # Analyze articulation
-            articulation = self._analyze_articulation(notes)
+        except Exception as e:
+            self.logger.error(f"Error in audio analysis: {str(e)}")
+            raise
+    
+    def analyze_batch(
+        self,
+        audio_paths: List[str],
+        instruments: List[str],
+        apply_noise_reduction: bool = True
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Analyze several audio files with batched pitch-tracking passes
+        
+        A recording that cannot be loaded or analyzed only fails itself; the
+        rest of the batch is still analyzed.
+        
+        Args:
+            audio_paths: Paths to audio files
+            instruments: Instrument type for each file
+            apply_noise_reduction: Apply noise reduction
             
-            analysis = {
-                'notes': notes,
-                'tempo': tempo,
-                'dynamics': dynamics,
-                'rhythm': rhythm,
-                'pitch_range': pitch_range,
-                'articulation': articulation,
-                'duration': len(audio) / sr,
-                'instrument': instrument,
-                'transcription_method': 'librosa pitch detection',
-                'total_notes': len(notes),
-                'sample_rate': sr,
-                'has_real_transcription': True
-            }
+        Returns:
+            One analysis per input, in the same order (the exception instead
+            of an analysis for recordings that failed)
+        """
+        self.logger.info(f"Analyzing batch of {len(audio_paths)} recordings with librosa")
+        sr = self.sample_rate
+        
+        # Decode and denoise the recordings in parallel, each in its own try
+        with ThreadPoolExecutor(max_workers=len(audio_paths)) as pool:
+            loaded = list(pool.map(lambda path: self._try_load_audio(path, apply_noise_reduction), audio_paths))
+        
+        results: List[Union[Dict[str, Any], Exception]] = list(loaded)
+        ready = [i for i, item in enumerate(loaded) if not isinstance(item, Exception)]
+        
+        for group in self._length_buckets([len(loaded[i][0]) for i in ready]):
+            indices = [ready[j] for j in group]
             
-            self.logger.info(f"Analysis complete: {len(notes)} notes detected")
-            return analysis
+            try:
+                # Zero-pad to a common length and run one STFT/piptrack over the stack
+                max_len = max(len(loaded[i][0]) for i in indices)
+                batch = np.zeros((len(indices), max_len), dtype=np.float32)
+                for row, i in enumerate(indices):
+                    batch[row, :len(loaded[i][0])] = loaded[i][0]
+                
+                pitches, magnitudes = self._piptrack(batch, sr)
+            except Exception as e:
+                self.logger.error(f"Batched pitch tracking failed: {str(e)}")
+                for i in indices:
+                    results[i] = e
+                continue
             
+            for row, i in enumerate(indices):
+                audio = loaded[i][0]
+                try:
+                    # Drop the frames that only cover padding
+                    n_frames = 1 + len(audio) // self.hop_length
+                    results[i] = self._analyze_audio(
+                        audio, sr, instruments[i],
+                        pitch_track=(pitches[row, :, :n_frames], magnitudes[row, :, :n_frames])
+                    )
+                except Exception as e:
+                    self.logger.error(f"Error analyzing {audio_paths[i]}: {str(e)}")
+                    results[i] = e
+        
+        return results
+    
+    def _try_load_audio(self, audio_path: str, apply_noise_reduction: bool) -> Union[Tuple[np.ndarray, int], Exception]:
+        """Load a recording for a batch, returning the exception instead of raising"""
+        try:
+            return self._load_audio(audio_path, apply_noise_reduction)
         except Exception as e:
-            self.logger.error(f"Error in audio analysis: {str(e)}")
-            raise
+            self.logger.error(f"Error loading {audio_path}: {str(e)}")
+            return e
     
-    def _extract_notes_librosa(self, audio: np.ndarray, sr: int) -> List[Dict[str, Any]]:
-        """Extract notes using librosa's pitch detection"""
+    def _length_buckets(self, lengths: List[int]) -> List[List[int]]:
+        """
+        Group recordings of similar length so padding stays small
+        
+        Args:
+            lengths: Sample count of each recording
+            
+        Returns:
+            Lists of positions into lengths; each group's padded size
+            (count x longest) stays within BATCH_MAX_SAMPLES, except for a
+            single recording longer than that on its own
+        """
+        buckets: List[List[int]] = []
+        current: List[int] = []
+        
+        # Ascending order: the newest member is always the group's longest
+        for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+            if current and (len(current) + 1) * lengths[i] > BATCH_MAX_SAMPLES:
+                buckets.append(current)
+                current = []
+            current.append(i)
+        
+        if current:
+            buckets.append(current)
+        
+        return buckets
+    
+    def _load_audio(self, audio_path: str, apply_noise_reduction: bool) -> Tuple[np.ndarray, int]:
+        """Load audio at the analysis sample rate and optionally denoise it"""
+        audio, sr = librosa.load(audio_path, sr=self.sample_rate)
+        
+        # Apply noise reduction if requested
+        if apply_noise_reduction:
+            audio = self._reduce_noise(audio, sr)
+        
+        return audio, sr
+    
+    def _piptrack(self, audio: np.ndarray, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Run librosa's piptrack over a mono signal or a (batch, samples) stack"""
+        return librosa.piptrack(y=audio, sr=sr, hop_length=self.hop_length, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'))
+    
+    def _analyze_audio(
+        self,
+        audio: np.ndarray,
+        sr: int,
+        instrument: str,
+        pitch_track: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """Build the full analysis for loaded audio"""
+        # Extract notes using librosa pitch detection
+        note_arrays = self._extract_notes_librosa(audio, sr, pitch_track)
+        
+        # Calculate tempo
+        tempo = self._calculate_tempo_librosa(audio, sr)
+        
+        # Analyze dynamics
+        dynamics = self._analyze_dynamics(audio, sr)
+        
+        # Analyze rhythm
+        rhythm = self._analyze_rhythm(note_arrays)
+        
+        # Calculate pitch range
+        pitch_range = self._calculate_pitch_range(note_arrays)
+        
+        # Analyze articulation
+        articulation = self._analyze_articulation(note_arrays)
+        
+        analysis = {
+            'notes': self._arrays_to_notes(note_arrays),
+            'tempo': tempo,
+            'dynamics': dynamics,
+            'rhythm': rhythm,
+            'pitch_range': pitch_range,
+            'articulation': articulation,
+            'duration': len(audio) / sr,
+            'instrument': instrument,
+            'transcription_method': 'librosa pitch detection',
+            'total_notes': note_arrays['n'],
+            'sample_rate': sr,
+            'has_real_transcription': True
+        }
+        
+        self.logger.info(f"Analysis complete: {note_arrays['n']} notes detected")
+        return analysis
+    
+    def _extract_notes_librosa(
+        self,
+        audio: np.ndarray,
+        sr: int,
+        pitch_track: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract notes using librosa's pitch detection (reusing a batched pitch track if given)
+        
+        Returns:
+            Structure-of-arrays notes: n, pitch, onset_sec, dur_sec, velocity, frequency
+        """
         try:
             # Use librosa's piptrack for pitch detection
-            pitches, magnitudes = librosa.piptrack(y=audio, sr=sr, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'))
+            if pitch_track is None:
+                pitch_track = self._piptrack(audio, sr)
+            pitches, magnitudes = pitch_track
             
             # Get onset times
-            onset_frames = librosa.onset.onset_detect(y=audio, sr=sr, units='frames')
-            onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+            onset_frames = librosa.onset.onset_detect(y=audio, sr=sr, units='frames', hop_length=self.hop_length)
+            onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=self.hop_length)
             
-            notes = []
-            for i, onset_time in enumerate(onset_times):
-                # Get the frame index
-                frame_idx = onset_frames[i]
-                
-                # Get pitch at this frame
-                pitch_idx = magnitudes[:, frame_idx].argmax()
-                pitch_hz = pitches[pitch_idx, frame_idx]
-                
-                if pitch_hz > 0:  # Valid pitch detected
-                    # Convert Hz to MIDI note
-                    midi_note = librosa.hz_to_midi(pitch_hz)
-                    
-                    # Estimate duration (time to next onset or end)
-                    if i < len(onset_times) - 1:
-                        duration = onset_times[i + 1] - onset_time
-                    else:
-                        duration = len(audio) / sr - onset_time
-                    
-                    # Estimate velocity from magnitude
-                    velocity = int(np.clip(magnitudes[pitch_idx, frame_idx] * 127, 0, 127))
-                    
-                    notes.append({
-                        'pitch': int(round(midi_note)),
-                        'start': float(onset_time),
-                        'end': float(onset_time + duration),
-                        'duration': float(duration),
-                        'velocity': velocity,
-                        'frequency': float(pitch_hz)
-                    })
+            if len(onset_frames) == 0:
+                return self._empty_note_arrays()
+            
+            # Strongest pitch bin at every onset frame
+            pitch_idx = magnitudes[:, onset_frames].argmax(axis=0)
+            pitch_hz = pitches[pitch_idx, onset_frames]
+            peak_magnitude = magnitudes[pitch_idx, onset_frames]
+            
+            # Each note lasts until the next onset (or the end of the recording)
+            durations = np.diff(onset_times, append=len(audio) / sr)
             
-            return notes
+            # Keep onsets with a valid pitch
+            valid = pitch_hz > 0
+            pitch_hz = pitch_hz[valid]
+            
+            return {
+                'n': int(valid.sum()),
+                'pitch': np.rint(librosa.hz_to_midi(pitch_hz)).astype(np.int16),
+                'onset_sec': onset_times[valid].astype(np.float64),
+                'dur_sec': durations[valid].astype(np.float32),
+                'velocity': np.clip(peak_magnitude[valid] * 127, 0, 127).astype(np.int16).astype(np.float32),
+                'frequency': pitch_hz.astype(np.float32)
+            }
             
         except Exception as e:
             self.logger.warning(f"Error in note extraction: {str(e)}, returning empty note list")
-            return []
+            return self._empty_note_arrays()
+    
+    def _empty_note_arrays(self) -> Dict[str, Any]:
+        """Note arrays for a recording with no detected notes"""
+        arrays = empty_note_arrays()
+        arrays['frequency'] = np.zeros(0, dtype=np.float32)
+        return arrays
+    
+    def _arrays_to_notes(self, note_arrays: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Expand note arrays into per-note dicts for the UI and stored sessions"""
+        return [{
+            'pitch': int(pitch),
+            'start': float(onset),
+            'end': float(onset + duration),
+            'duration': float(duration),
+            'velocity': int(velocity),
+            'frequency': float(frequency)
+        } for pitch, onset, duration, velocity, frequency in zip(
+            note_arrays['pitch'],
+            note_arrays['onset_sec'],
+            note_arrays['dur_sec'],
+            note_arrays['velocity'],
+            note_arrays['frequency']
+        )]
     
     def _calculate_tempo_librosa(self, audio: np.ndarray, sr: int) -> float:
         """Calculate tempo using librosa"""
@@ -161,36 +331,36 @@ class RealAudioAnalyzer:
             'variation': float(np.std(rms))
         }
     
-    def _analyze_rhythm(self, notes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _analyze_rhythm(self, note_arrays: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze rhythm patterns"""
-        if not notes:
+        if not note_arrays['n']:
             return {'regularity': 0.0, 'pattern': 'unknown'}
         
-        durations = [n['duration'] for n in notes]
+        durations = note_arrays['dur_sec']
         return {
             'regularity': float(1.0 - np.std(durations) / (np.mean(durations) + 0.001)),
             'average_duration': float(np.mean(durations)),
             'pattern': 'detected'
         }
     
-    def _calculate_pitch_range(self, notes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _calculate_pitch_range(self, note_arrays: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate pitch range"""
-        if not notes:
+        if not note_arrays['n']:
             return {'min': 0, 'max': 0, 'range': 0}
         
-        pitches = [n['pitch'] for n in notes]
+        pitches = note_arrays['pitch']
         return {
-            'min': int(min(pitches)),
-            'max': int(max(pitches)),
-            'range': int(max(pitches) - min(pitches))
+            'min': int(pitches.min()),
+            'max': int(pitches.max()),
+            'range': int(pitches.max() - pitches.min())
         }
     
-    def _analyze_articulation(self, notes: List[Dict[str, Any]]) -> Dict[str, str]:
+    def _analyze_articulation(self, note_arrays: Dict[str, Any]) -> Dict[str, str]:
         """Analyze articulation"""
-        if not notes:
+        if not note_arrays['n']:
             return {'style': 'unknown'}
         
-        avg_duration = np.mean([n['duration'] for n in notes])
+        avg_duration = np.mean(note_arrays['dur_sec'])
         
         if avg_duration < 0.3:
             style = 'staccato'
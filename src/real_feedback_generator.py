@@ -6,6 +6,8 @@ import logging
 from typing import Dict, List, Any
 import numpy as np
 
+from src.note_alignment import match_onsets, get_note_arrays, midi_to_name
+
 try:
     from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
     import torch
@@ -89,8 +91,8 @@ class RealFeedbackGenerator:
             
             # Real pitch accuracy analysis
             pitch_feedback = self._analyze_pitch_accuracy(
-                sheet_music_analysis['notes'],
-                audio_analysis['notes']
+                get_note_arrays(sheet_music_analysis, quarter_lengths=True),
+                get_note_arrays(audio_analysis)
             )
             
             # Real rhythm analysis
@@ -158,77 +160,59 @@ class RealFeedbackGenerator:
     
     def _analyze_pitch_accuracy(
         self,
-        expected_notes: List[Dict],
-        played_notes: List[Dict]
+        expected: Dict[str, Any],
+        played: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Real pitch accuracy comparison"""
-        if not expected_notes or not played_notes:
+        """Real pitch accuracy comparison on structure-of-arrays notes"""
+        if not expected['n'] or not played['n']:
             return {
                 'score': 0,
                 'correct_notes': 0,
-                'total_notes': len(expected_notes),
+                'total_notes': expected['n'],
                 'accuracy': 0.0,
                 'errors': []
             }
         
-        correct_count = 0
-        errors = []
-        
         # Align notes by timing
-        expected_aligned = sorted(expected_notes, key=lambda x: x.get('start_time', 0))
-        played_aligned = sorted(played_notes, key=lambda x: x.get('start_time', 0))
-        
-        # Match notes within time windows
-        for i, expected_note in enumerate(expected_aligned):
-            expected_pitch = expected_note.get('pitch', '')
-            expected_time = expected_note.get('start_time', 0)
-            
-            # Find closest played note within 0.5 second window
-            closest_played = None
-            min_time_diff = float('inf')
-            
-            for played_note in played_aligned:
-                played_time = played_note.get('start_time', 0)
-                time_diff = abs(played_time - expected_time)
-                
-                if time_diff < 0.5 and time_diff < min_time_diff:
-                    closest_played = played_note
-                    min_time_diff = time_diff
-            
-            if closest_played:
-                played_pitch = closest_played.get('pitch', '')
-                if expected_pitch == played_pitch:
-                    correct_count += 1
-                else:
-                    errors.append({
-                        'position': i,
-                        'expected': expected_pitch,
-                        'played': played_pitch,
-                        'time': expected_time
-                    })
-            else:
-                errors.append({
-                    'position': i,
-                    'expected': expected_pitch,
-                    'played': 'MISSING',
-                    'time': expected_time
-                })
+        expected_order = np.argsort(expected['onset_sec'], kind='stable')
+        played_order = np.argsort(played['onset_sec'], kind='stable')
+        expected_times = expected['onset_sec'][expected_order]
+        expected_pitches = expected['pitch'][expected_order]
+        played_times = played['onset_sec'][played_order]
+        played_pitches = played['pitch'][played_order]
+        
+        # Match notes within a 0.5 second window (compiled kernel over onset arrays)
+        matches = match_onsets(expected_times, played_times, 0.5)
+        matched = matches >= 0
+        matched_pitches = np.where(matched, played_pitches[np.maximum(matches, 0)], -1)
+        correct = matched & (matched_pitches == expected_pitches)
+        correct_count = int(correct.sum())
+        
+        # Only the first 10 errors are reported
+        errors = []
+        for i in np.flatnonzero(~correct)[:10]:
+            errors.append({
+                'position': int(i),
+                'expected': midi_to_name(int(expected_pitches[i])),
+                'played': midi_to_name(int(matched_pitches[i])) if matched[i] else 'MISSING',
+                'time': round(float(expected_times[i]), 3)
+            })
         
         # Check for extra notes
-        if len(played_aligned) > len(expected_aligned):
+        if played['n'] > expected['n'] and len(errors) < 10:
             errors.append({
                 'type': 'extra_notes',
-                'count': len(played_aligned) - len(expected_aligned)
+                'count': played['n'] - expected['n']
             })
         
-        accuracy = (correct_count / len(expected_aligned)) * 100 if expected_aligned else 0
+        accuracy = (correct_count / expected['n']) * 100
         
         return {
             'score': int(accuracy),
             'correct_notes': correct_count,
-            'total_notes': len(expected_aligned),
+            'total_notes': expected['n'],
             'accuracy': round(accuracy, 2),
-            'errors': errors[:10]  # Limit to first 10 errors
+            'errors': errors
         }
     
     def _analyze_rhythm_accuracy(
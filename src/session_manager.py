@@ -2,11 +2,12 @@
 Session Manager - Manages practice sessions and historical data
 """
 import logging
-import json
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 
-from src.database import db_session, Piece, PracticeSession
+from sqlalchemy import func
+
+from src.database import db_session, Piece, PracticeSession, pack_blob, unpack_blob
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +33,7 @@ class SessionManager:
         try:
             piece = Piece(
                 filename=filename,
-                analysis=json.dumps(analysis),
+                analysis=pack_blob(analysis),
                 upload_date=datetime.utcnow()
             )
             
@@ -58,7 +59,7 @@ class SessionManager:
             return {
                 'id': piece.id,
                 'filename': piece.filename,
-                'analysis': json.loads(piece.analysis),
+                'analysis': unpack_blob(piece.analysis),
                 'upload_date': piece.upload_date.isoformat()
             }
             
@@ -82,6 +83,26 @@ class SessionManager:
             self.logger.error(f"Error getting pieces: {str(e)}")
             raise
     
+    def get_pieces_version(self) -> str:
+        """
+        Get a version tag that changes whenever the pieces listing changes
+        
+        Pieces and sessions are only ever inserted, so row counts plus the
+        highest IDs identify the listing's state without loading any rows.
+        """
+        piece_count, max_piece_id = db_session.query(func.count(Piece.id), func.max(Piece.id)).one()
+        session_count, max_session_id = db_session.query(
+            func.count(PracticeSession.id), func.max(PracticeSession.id)
+        ).one()
+        return f"{piece_count}-{max_piece_id or 0}-{session_count}-{max_session_id or 0}"
+    
+    def get_sessions_version(self, piece_id: int) -> str:
+        """Get a version tag that changes whenever a piece's sessions change"""
+        session_count, max_session_id = db_session.query(
+            func.count(PracticeSession.id), func.max(PracticeSession.id)
+        ).filter(PracticeSession.piece_id == piece_id).one()
+        return f"{piece_id}-{session_count}-{max_session_id or 0}"
+    
     def save_session(
         self,
         piece_id: int,
@@ -104,8 +125,8 @@ class SessionManager:
         try:
             session = PracticeSession(
                 piece_id=piece_id,
-                audio_analysis=json.dumps(audio_analysis),
-                feedback=json.dumps(feedback),
+                audio_analysis=pack_blob(audio_analysis),
+                feedback=pack_blob(feedback),
                 instrument=instrument,
                 score=feedback['overall_score'],
                 session_date=datetime.utcnow()
@@ -182,8 +203,8 @@ class SessionManager:
             # Compare with most recent previous session
             previous = previous_sessions[0]
             
-            current_feedback = json.loads(current.feedback)
-            previous_feedback = json.loads(previous.feedback)
+            current_feedback = unpack_blob(current.feedback)
+            previous_feedback = unpack_blob(previous.feedback)
             
             score_change = current.score - previous.score
             
@@ -19,6 +19,10 @@ class SheetMusicAnalyzer:
         """Initialize the sheet music analyzer"""
         self.logger = logger
     
+    def analyze_sheet_music(self, pdf_path: str) -> Dict[str, Any]:
+        """Analyze a PDF (same entry point as the OMR systems)"""
+        return self.analyze(pdf_path)
+    
     def analyze(self, pdf_path: str) -> Dict[str, Any]:
         """
         Analyze a PDF sheet music file
@@ -422,12 +422,21 @@ async function analyzePerformance(audioFile) {
         
         const data = await response.json();
         
+        if (!data.success) {
+            document.getElementById('analysis-loading').style.display = 'none';
+            alert('Analysis failed: ' + data.error);
+            return;
+        }
+        
+        // Analysis runs in the background - poll until it finishes
+        const job = await pollJob(data.job_id);
+        
         document.getElementById('analysis-loading').style.display = 'none';
         
-        if (data.success) {
-            displayFeedback(data.feedback, data.comparison);
+        if (job.status === 'completed') {
+            displayFeedback(job.result.feedback, job.result.comparison);
         } else {
-            alert('Analysis failed: ' + data.error);
+            alert('Analysis failed: ' + job.error);
         }
     } catch (error) {
         document.getElementById('analysis-loading').style.display = 'none';
@@ -435,6 +444,27 @@ async function analyzePerformance(audioFile) {
     }
 }
 
+async function pollJob(jobId, intervalMs = 1000, timeoutMs = 15 * 60 * 1000) {
+    const deadline = Date.now() + timeoutMs;
+    
+    while (Date.now() < deadline) {
+        const response = await fetch(`/api/job/${jobId}`);
+        const job = await response.json();
+        
+        if (!job.success) {
+            throw new Error(job.error);
+        }
+        
+        if (job.status === 'completed' || job.status === 'failed') {
+            return job;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    
+    throw new Error('Timed out waiting for the analysis to finish');
+}
+
 function displayFeedback(feedback, comparison) {
     // Hide practice section, show feedback
     document.getElementById('practice-section').style.display = 'none';